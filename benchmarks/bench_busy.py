@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""Wake-up latency and CPU cost of waiting for BUSY on the virtual backend.
+
+Each round holds BUSY for a refresh of random length and measures how
+late the waiter notices the release and how much CPU it burns meanwhile,
+for the old delay_ms polling loops and for epdconfig.wait_for_pin.
+The virtual wait_for_pin sleeps straight to the release, like an edge
+wakeup; on the Pi the gpiozero callback thread adds its own latency.
+
+Run from the repository root:  python3 benchmarks/bench_busy.py
+"""
+import sys
+import os
+import time
+import random
+
+os.environ['EPD_BACKEND'] = 'virtual'
+os.environ['EPD_VIRTUAL_TIME_SCALE'] = '1'
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from waveshare_epd import epdconfig
+
+ROUNDS = 10
+BUSY_MS = (200, 400)
+
+
+def poll_loop(interval_ms):
+    # The loop every ReadBusy used before wait_for_pin
+    def wait(pin, level):
+        while epdconfig.digital_read(pin) != level:
+            epdconfig.delay_ms(interval_ms)
+    return wait
+
+
+def spin_loop(pin, level):
+    # ReadBusy in the 7in5 HD/V2 drivers re-read the pin without sleeping
+    while epdconfig.digital_read(pin) != level:
+        pass
+
+
+def measure(wait):
+    impl = epdconfig.implementation
+    idle = 1 - impl.busy_level
+    latency = cpu = 0.0
+    for _ in range(ROUNDS):
+        busy_ms = random.uniform(*BUSY_MS)
+        release = time.perf_counter() + busy_ms / 1000.0
+        impl.set_busy(busy_ms)
+        cpu_start = time.process_time()
+        wait(impl.BUSY_PIN, idle)
+        latency += time.perf_counter() - release
+        cpu += time.process_time() - cpu_start
+    return latency / ROUNDS, cpu / ROUNDS
+
+
+def main():
+    waits = [("poll %d ms" % ms, poll_loop(ms)) for ms in (5, 10, 20, 100, 200)]
+    waits.append(("busy spin", spin_loop))
+    waits.append(("wait_for_pin", epdconfig.wait_for_pin))
+    print("%-14s %14s %14s" % ("wait", "latency ms", "cpu ms"))
+    for name, wait in waits:
+        latency, cpu = measure(wait)
+        print("%-14s %14.2f %14.2f" % (name, latency * 1e3, cpu * 1e3))
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""Profile getbuffer/display/Clear of every driver on the virtual backend.
+
+Panel waits and SPI wire time are simulated (EPD_VIRTUAL_TIME_SCALE=0),
+so "host" is the CPU-side cost of each call and "panel" the time the
+real panel would have kept BUSY asserted.
+
+Run from the repository root:  python3 benchmarks/bench_drivers.py [epd2in66g ...]
+"""
+import sys
+import os
+import glob
+import time
+import inspect
+import importlib
+
+os.environ.setdefault('EPD_BACKEND', 'virtual')
+os.environ.setdefault('EPD_VIRTUAL_TIME_SCALE', '0')
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig, epdsession
+
+
+def driver_names():
+    paths = glob.glob(os.path.join(libdir, 'waveshare_epd', 'epd[0-9]*.py'))
+    return sorted(os.path.basename(path)[:-3] for path in paths)
+
+
+def test_image(epd):
+    image = Image.new('RGB', (epd.width, epd.height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, epd.width // 2, epd.height // 2), fill=(0, 0, 0))
+    draw.ellipse((epd.width // 4, epd.height // 4, epd.width - 1, epd.height - 1), fill=(255, 0, 0))
+    return image
+
+
+def measure(func):
+    impl = epdconfig.implementation
+    impl.reset_stats()
+    start = time.perf_counter()
+    result = func()
+    host = time.perf_counter() - start - (impl.wait_time + impl.bus_time) * impl.time_scale
+    return result, host, impl.wait_time
+
+
+def main(names):
+    print("%-16s %10s %10s %10s %10s %10s" % (
+        "driver", "buffer ms", "display ms", "panel s", "Clear ms", "panel s"))
+    for name in names:
+        try:
+            module = importlib.import_module('waveshare_epd.' + name)
+        except ImportError as e:
+            print("%-16s skipped: %s" % (name, e))
+            continue
+        epd = module.EPD()
+        # The full-refresh calls of the driver, as DisplaySession runs them
+        calls = epdsession.driver_calls(epd)
+        try:
+            epdsession.invoke(epd, calls.init)
+            buf, t_buf, _ = measure(lambda: epd.getbuffer(test_image(epd)))
+            method = getattr(epd, calls.display)
+            display = method if len(inspect.signature(method).parameters) == 1 else (lambda b: method(b, b))
+
+            def refresh():
+                display(buf)
+                for call in calls.finish:
+                    epdsession.invoke(epd, call)
+            _, t_disp, w_disp = measure(refresh)
+            _, t_clear, w_clear = measure(lambda: epdsession.invoke(epd, calls.clear))
+        except Exception as e:
+            print("%-16s failed: %s: %s" % (name, type(e).__name__, e))
+            continue
+        print("%-16s %10.1f %10.1f %10.1f %10.1f %10.1f" % (
+            name, t_buf * 1e3, t_disp * 1e3, w_disp, t_clear * 1e3, w_clear))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or driver_names())
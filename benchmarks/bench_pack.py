@@ -0,0 +1,338 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""Compare the shared epdbuffer packers against the per-pixel loops they replaced,
+and the palette lookup table against PIL quantize.
+
+Run from the repository root:  python3 benchmarks/bench_pack.py
+"""
+import sys
+import os
+import time
+import random
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+import numpy as np
+from PIL import Image
+from waveshare_epd import epdbuffer
+
+# (panel, width, height) for the 1bpp drivers on epdbuffer.pack_1bpp
+PANELS_1BPP = [
+    ("1in54", 200, 200),
+    ("2in13", 122, 250),
+    ("2in7", 176, 264),
+    ("2in9", 128, 296),
+    ("4in2", 400, 300),
+]
+
+# (panel, width, height) for the tri-color b/bc drivers
+PANELS_TRICOLOR = [
+    ("2in9b_V4", 128, 296),
+    ("4in2b_V2", 400, 300),
+    ("7in5b_V2", 800, 480),
+    ("13in3b", 960, 680),
+]
+
+# (panel, width, height) for the drivers with getbuffer_4Gray
+PANELS_4GRAY = [
+    ("2in7", 176, 264),
+    ("2in9_V2", 128, 296),
+    ("3in7", 280, 480),
+    ("4in2", 400, 300),
+    ("5in79", 792, 272),
+    ("7in5_V2", 800, 480),
+    ("13in3k", 960, 680),
+]
+
+# (panel, width, height) for the 4-color "g" drivers
+PANELS_2BPP = [
+    ("1in64g", 168, 168),
+    ("2in13g", 122, 250),
+    ("2in15g", 160, 296),
+    ("2in36g", 168, 296),
+    ("2in66g", 184, 360),
+    ("3in0g", 168, 400),
+    ("4in37g", 512, 368),
+    ("5in79g", 792, 272),
+    ("7in3g", 800, 480),
+]
+
+# (panel, width, height) for the 7-color ACeP drivers
+PANELS_4BPP = [
+    ("4in01f", 640, 400),
+    ("5in65f", 600, 448),
+    ("7in3e", 800, 480),
+    ("7in3f", 800, 480),
+]
+
+
+def legacy_pack_1bpp(image, width, height):
+    # The loop epd4in2/2in7/1in54/2in13/2in9 getbuffer used before
+    # epdbuffer.pack_1bpp, with epd2in13's row padding
+    linewidth = (width + 7) // 8
+    buf = [0xFF] * (linewidth * height)
+    image_monocolor = image.convert('1')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    if imwidth == width and imheight == height:
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0:
+                    buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+    elif imwidth == height and imheight == width:
+        for y in range(imheight):
+            for x in range(imwidth):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0:
+                    buf[int(newx / 8) + newy * linewidth] &= ~(0x80 >> (y % 8))
+    return buf
+
+
+def legacy_pack_4gray(image, width, height):
+    # The getbuffer_4Gray loop shared by the 4-gray drivers before
+    # epdbuffer.pack_4gray, rotating landscape images
+    buf = [0xFF] * (int(width / 4) * height)
+    image_monocolor = image.convert('L')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    i = 0
+    if imwidth == width and imheight == height:
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0xC0:
+                    pixels[x, y] = 0x80
+                elif pixels[x, y] == 0x80:
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if i % 4 == 0:
+                    buf[int((x + (y * width)) / 4)] = ((pixels[x-3, y] & 0xc0) | (pixels[x-2, y] & 0xc0) >> 2 | (pixels[x-1, y] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
+    elif imwidth == height and imheight == width:
+        for x in range(imwidth):
+            for y in range(imheight):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0xC0:
+                    pixels[x, y] = 0x80
+                elif pixels[x, y] == 0x80:
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if i % 4 == 0:
+                    buf[int((newx + (newy * width)) / 4)] = ((pixels[x, y-3] & 0xc0) | (pixels[x, y-2] & 0xc0) >> 2 | (pixels[x, y-1] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
+    return buf
+
+
+def legacy_split_4gray(frame, first, second):
+    # The display_4Gray plane loops before epdbuffer.split_4gray, one
+    # pass per plane with the level-to-bit choice spelled out per pixel
+    planes = []
+    for bits in (first, second):
+        plane = [0x00] * (len(frame) // 2)
+        for i in range(len(plane)):
+            temp3 = 0
+            for j in range(0, 2):
+                temp1 = frame[i*2+j]
+                for k in range(0, 4):
+                    temp3 = (temp3 << 1) | bits[(temp1 & 0xC0) >> 6]
+                    temp1 <<= 2
+            plane[i] = temp3
+        planes.append(plane)
+    return planes
+
+
+def legacy_pack_2bpp(buf_4color, width, height):
+    # The loop the g-series getbuffer used before epdbuffer.pack_2bpp
+    Width = width // 4 if width % 4 == 0 else width // 4 + 1
+    buf = [0x00] * int(Width * height)
+    idx = 0
+    for j in range(0, height):
+        for i in range(0, Width):
+            if i == Width - 1 and width % 4:
+                buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4)
+                idx = idx + 2
+            else:
+                buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4) + (buf_4color[idx+2] << 2) + buf_4color[idx+3]
+                idx = idx + 4
+    return buf
+
+
+def legacy_pack_4bpp(buf_7color, width, height):
+    # The loop the ACeP getbuffer used before epdbuffer.pack_4bpp
+    buf = [0x00] * int(width * height / 2)
+    idx = 0
+    for i in range(0, len(buf_7color), 2):
+        buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
+        idx += 1
+    return buf
+
+
+def best_of(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def random_image(width, height):
+    return Image.frombytes('L', (width, height), bytes(random.choice((0, 255)) for _ in range(width * height)))
+
+
+def bench_1bpp():
+    print("1bpp packing (black/white panels, both orientations)")
+    print("%-12s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    for name, width, height in PANELS_1BPP:
+        for orientation, size in (("", (width, height)), (" rot", (height, width))):
+            image = random_image(*size)
+            t_old, old = best_of(lambda: legacy_pack_1bpp(image, width, height))
+            t_new, new = best_of(lambda: epdbuffer.pack_1bpp(image, width, height))
+            assert bytes(old) == bytes(new), "%s%s: packed output differs" % (name, orientation)
+            print("%-12s %10d %10.2f %10.2f %7.1fx" % (name + orientation, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def random_gray_image(width, height):
+    return Image.frombytes('L', (width, height), bytes(random.choice((0x00, 0x80, 0xC0, 0xFF)) for _ in range(width * height)))
+
+
+def bench_4gray():
+    print("4-gray encoding (getbuffer_4Gray, both orientations)")
+    print("%-12s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    for name, width, height in PANELS_4GRAY:
+        for orientation, size in (("", (width, height)), (" rot", (height, width))):
+            image = random_gray_image(*size)
+            t_old, old = best_of(lambda: legacy_pack_4gray(image, width, height))
+            t_new, new = best_of(lambda: epdbuffer.pack_4gray(image, width, height))
+            assert bytes(old) == bytes(new), "%s%s: packed output differs" % (name, orientation)
+            print("%-12s %10d %10.2f %10.2f %7.1fx" % (name + orientation, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def bench_split():
+    print("4-gray plane split (display_4Gray)")
+    print("%-12s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    for name, width, height in PANELS_4GRAY:
+        frame = bytearray(random.randrange(256) for _ in range(width * height // 4))
+        planes = (epdbuffer.GRAY4_NOT_LOW_BIT, epdbuffer.GRAY4_NOT_HIGH_BIT)
+        t_old, old = best_of(lambda: legacy_split_4gray(frame, *planes))
+        t_new, new = best_of(lambda: epdbuffer.split_4gray(frame, *planes))
+        assert [bytes(p) for p in old] == [bytes(p) for p in new], "%s: planes differ" % name
+        print("%-12s %10d %10.2f %10.2f %7.1fx" % (name, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def legacy_tricolor(image, width, height):
+    # What callers did before getbuffer_color: one mask image per plane,
+    # then getbuffer on each
+    gray = image.convert('L')
+    black = gray.point(lambda v: 0 if v < 32 else 255)
+    # Pure red lands at L = 76
+    red = gray.point(lambda v: 0 if 32 <= v < 160 else 255)
+    return legacy_pack_1bpp(black, width, height), legacy_pack_1bpp(red, width, height)
+
+
+def bench_tricolor():
+    print("tri-color planes (getbuffer twice vs getbuffer_color)")
+    print("%-12s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    colors = ((255, 255, 255), (0, 0, 0), (255, 0, 0))
+    for name, width, height in PANELS_TRICOLOR:
+        image = Image.new('RGB', (width, height))
+        image.putdata([random.choice(colors) for _ in range(width * height)])
+        t_old, old = best_of(lambda: legacy_tricolor(image, width, height))
+        t_new, new = best_of(lambda: epdbuffer.split_tricolor(image, width, height))
+        assert [bytes(p) for p in old] == [bytes(p) for p in new], "%s: planes differ" % name
+        print("%-12s %10d %10.2f %10.2f %7.1fx" % (name, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def bench_2bpp():
+    print("2bpp packing (4-color g panels)")
+    print("%-8s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    for name, width, height in PANELS_2BPP:
+        indices = bytearray(random.randrange(4) for _ in range(width * height))
+        t_old, old = best_of(lambda: legacy_pack_2bpp(indices, width, height))
+        t_new, new = best_of(lambda: epdbuffer.pack_2bpp(indices, width, height))
+        assert bytes(old) == bytes(new), "%s: packed output differs" % name
+        print("%-8s %10d %10.2f %10.2f %7.1fx" % (name, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def bench_4bpp():
+    print("4bpp packing (7-color ACeP panels)")
+    print("%-8s %10s %10s %10s %8s" % ("panel", "pixels", "loop ms", "numpy ms", "speedup"))
+    for name, width, height in PANELS_4BPP:
+        indices = bytearray(random.randrange(7) for _ in range(width * height))
+        t_old, old = best_of(lambda: legacy_pack_4bpp(indices, width, height))
+        t_new, new = best_of(lambda: epdbuffer.pack_4bpp(indices, width, height))
+        assert bytes(old) == bytes(new), "%s: packed output differs" % name
+        print("%-8s %10d %10.2f %10.2f %7.1fx" % (name, width * height, t_old * 1e3, t_new * 1e3, t_old / t_new))
+
+
+def photo_image(width, height):
+    # Smooth color gradients with noise, closer to camera frames than
+    # flat test patterns
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    rgb = np.stack(np.broadcast_arrays(x * 255, y * 255, (1 - x * y) * 255), axis=-1)
+    rgb += np.random.RandomState(0).normal(0, 24, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), 'RGB')
+
+
+def nearest_indices(image, palette):
+    pixels = np.asarray(image, dtype=np.int32)[..., None, :]
+    return ((pixels - np.array(palette, dtype=np.int32)) ** 2).sum(axis=-1).argmin(axis=-1)
+
+
+def color_error(image, indices, palette):
+    # Mean RGB distance between the source and the panel colors it got
+    mapped = np.array(palette, dtype=np.float32)[np.frombuffer(indices, dtype=np.uint8)]
+    source = np.asarray(image, dtype=np.float32).reshape(-1, 3)
+    return np.sqrt(((mapped - source) ** 2).sum(axis=1)).mean()
+
+
+def bench_quantize():
+    print("palette mapping (quantize with a fresh palette vs cached palette, lookup table for arrays)")
+    print("%-8s %10s %9s %9s %9s %9s %9s %9s %9s" % (
+        "panel", "pixels", "fresh ms", "FS ms", "none ms", "LUT ms", "LUT err", "none miss", "LUT miss"))
+    panels = [(name, width, height, epdbuffer.PALETTE_4COLOR) for name, width, height in PANELS_2BPP]
+    panels += [(name, width, height, epdbuffer.PALETTE_7COLOR) for name, width, height in PANELS_4BPP]
+    for name, width, height, palette in panels:
+        image = photo_image(width, height)
+        flat = sum(palette, ()) + (0, 0, 0) * (256 - len(palette))
+
+        def fresh():
+            # What every getbuffer did before the palette cache
+            pal_image = Image.new("P", (1, 1))
+            pal_image.putpalette(flat)
+            return image.convert("RGB").quantize(palette=pal_image).tobytes('raw')
+
+        pal_image = epdbuffer.palette_image(palette)
+        epdbuffer.palette_lut(palette)
+        t_fresh, old = best_of(fresh)
+        t_fs, new = best_of(lambda: epdbuffer.quantize(image, palette))
+        assert old == new, "%s: dithered output differs" % name
+        t_none, plain = best_of(lambda: epdbuffer.quantize(image, palette, dither=False))
+        assert plain == image.quantize(palette=pal_image, dither=Image.NONE).tobytes('raw')
+        # The lookup table serves array input such as camera frames
+        pixels = np.asarray(image.convert("RGB"))
+        t_lut, lut = best_of(lambda: epdbuffer.quantize(pixels, palette, dither=False))
+        # Against the exact nearest color: mean color error of the table
+        # over quantize without dithering, and the share of pixels either
+        # one gave another color
+        exact = np.frombuffer(nearest_indices(image, palette).astype(np.uint8).tobytes(), dtype=np.uint8)
+        err = color_error(image, lut, palette) - color_error(image, plain, palette)
+        miss_none = np.mean(np.frombuffer(plain, dtype=np.uint8) != exact)
+        miss_lut = np.mean(np.frombuffer(lut, dtype=np.uint8) != exact)
+        print("%-8s %10d %9.2f %9.2f %9.2f %9.2f %+9.2f %8.2f%% %8.2f%%" % (
+            name, width * height, t_fresh * 1e3, t_fs * 1e3, t_none * 1e3, t_lut * 1e3, err,
+            miss_none * 100, miss_lut * 100))
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    bench_1bpp()
+    bench_4gray()
+    bench_split()
+    bench_tricolor()
+    bench_2bpp()
+    bench_4bpp()
+    bench_quantize()
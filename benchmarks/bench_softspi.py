@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""Per-frame cost of the Jetson Nano software-SPI transfer paths.
+
+The bit-banging itself costs the same on every path, so the shared
+library is replaced by libc functions with the same call shape: abs()
+for SYSFS_software_spi_transfer and strnlen() for the bulk
+SYSFS_software_spi_writebytes. What is left is the Python and ctypes
+overhead each path adds per frame.
+
+Run from the repository root:  python3 benchmarks/bench_softspi.py
+"""
+import sys
+import os
+import time
+import ctypes
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from waveshare_epd import epdconfig
+
+# (panel, frame bytes)
+FRAMES = [
+    ("2in13_V4", 122 // 8 * 250 + 250),
+    ("4in2", 400 * 300 // 8),
+    ("7in5_V2", 800 * 480 // 8),
+    ("7in3f", 800 * 480 // 2),
+]
+
+
+class LegacyLib:
+    # sysfs_software_spi.so as shipped: no bulk entry point
+    def __init__(self):
+        self.SYSFS_software_spi_transfer = ctypes.CDLL(None).abs
+
+
+class BulkLib(LegacyLib):
+    def __init__(self):
+        super().__init__()
+        self.SYSFS_software_spi_writebytes = ctypes.CDLL(None).strnlen
+
+
+def backend(lib):
+    jetson = epdconfig.JetsonNano.__new__(epdconfig.JetsonNano)
+    jetson.SPI = lib
+    jetson._spi_transfer, jetson._spi_writebytes = epdconfig._bind_software_spi(lib)
+    return jetson
+
+
+def legacy_writebyte2(lib, data):
+    # The loop JetsonNano.spi_writebyte2 used before
+    for i in range(len(data)):
+        lib.SYSFS_software_spi_transfer(data[i])
+
+
+def best_of(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    legacy, bulk = backend(LegacyLib()), backend(BulkLib())
+    print("%-10s %8s %10s %12s %10s" % ("panel", "bytes", "loop ms", "fallback ms", "bulk ms"))
+    for name, size in FRAMES:
+        # No zero bytes, so the strnlen stand-in walks the whole frame
+        frame = [0x55] * size
+        t_loop = best_of(lambda: legacy_writebyte2(legacy.SPI, frame))
+        t_fallback = best_of(lambda: legacy.spi_writebyte2(frame))
+        t_bulk = best_of(lambda: bulk.spi_writebyte2(frame))
+        print("%-10s %8d %10.2f %12.2f %10.3f" % (
+            name, size, t_loop * 1e3, t_fallback * 1e3, t_bulk * 1e3))
+
+
+if __name__ == '__main__':
+    main()
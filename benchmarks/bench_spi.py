@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""SPI frame transfer throughput for each buffer type and clock speed,
+and for a one-byte fill as Clear sends it.
+
+On a Raspberry Pi this drives the real spidev transport (a panel need
+not be attached). Elsewhere set EPD_BACKEND=virtual, which charges the
+wire time of every byte at the configured clock.
+
+Run from the repository root:  python3 benchmarks/bench_spi.py
+"""
+import sys
+import os
+import time
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+import numpy as np
+from waveshare_epd import epdconfig
+
+# One epd13in3k frame, 960x680 at 1bpp
+FRAME_BYTES = 960 * 680 // 8
+SPEEDS_HZ = (4000000, 8000000, 16000000, 32000000)
+REPEAT = 3
+
+
+def buffers():
+    frame = [0x55] * FRAME_BYTES
+    yield "list", frame
+    yield "bytes", bytes(frame)
+    yield "bytearray", bytearray(frame)
+    yield "memoryview", memoryview(bytearray(frame))
+    yield "numpy uint8", np.full(FRAME_BYTES, 0x55, dtype=np.uint8)
+
+
+def senders():
+    for name, data in buffers():
+        yield name, lambda data=data: epdconfig.spi_writebyte2(data)
+    # What Clear used to do: build the list on every call
+    yield "new list", lambda: epdconfig.spi_writebyte2([0x55] * FRAME_BYTES)
+    yield "fill", lambda: epdconfig.spi_writefill(0x55, FRAME_BYTES)
+
+
+def main():
+    epdconfig.module_init()
+    print("frame %d bytes, chunk %d bytes, backend %s" % (
+        FRAME_BYTES, epdconfig.implementation.spi_bufsiz, epdconfig.detect_platform()))
+    print("%-12s" % "buffer" + "".join("%12s" % ("%d MHz" % (hz // 1000000)) for hz in SPEEDS_HZ) + "   (MB/s)")
+    for name, send in senders():
+        row = "%-12s" % name
+        for hz in SPEEDS_HZ:
+            epdconfig.SPI.max_speed_hz = hz
+            best = None
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                send()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            row += "%12.2f" % (FRAME_BYTES / best / 1e6)
+        print(row)
+    epdconfig.module_exit()
+
+
+if __name__ == '__main__':
+    main()
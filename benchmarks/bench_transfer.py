@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""Time frame uploads through a mock epdconfig backend.
+
+The mock counts SPI transactions and charges a fixed cost for each one,
+so the numbers show how much of an upload is per-transaction overhead.
+"legacy" replays the old one-send_data-per-byte path for comparison.
+
+Run from the repository root:  python3 benchmarks/bench_transfer.py
+"""
+import sys
+import os
+import time
+import types
+import importlib
+
+from PIL import Image
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+# The real module, for the transport helpers the mock shares with the backends
+from waveshare_epd import epdconfig
+
+# Drivers whose frame uploads moved to send_data2
+DRIVERS = [
+    'epd1in02', 'epd1in54', 'epd1in64g', 'epd2in13', 'epd2in13_V3', 'epd2in13g',
+    'epd2in15g', 'epd2in36g', 'epd2in66g', 'epd2in7', 'epd2in9', 'epd3in0g',
+    'epd4in37g', 'epd7in3g',
+]
+
+# Rough cost of one spidev ioctl plus the DC/CS GPIO toggles around it on a Pi Zero
+TRANSACTION_US = 30
+
+
+class MockBackend(types.ModuleType):
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self):
+        super().__init__('waveshare_epd.epdconfig')
+        self.transactions = 0
+        self.bytes = 0
+
+    def _charge(self, n):
+        self.transactions += 1
+        self.bytes += n
+        end = time.perf_counter() + TRANSACTION_US / 1e6
+        while time.perf_counter() < end:
+            pass
+
+    def digital_write(self, pin, value):
+        pass
+
+    def digital_read(self, pin):
+        return 0
+
+    def delay_ms(self, delaytime):
+        pass
+
+    def spi_writebyte(self, data):
+        self._charge(len(data))
+
+    def spi_writebyte2(self, data):
+        self._charge(len(data))
+
+    def spi_writefill(self, value, count):
+        # Slices of one cached run, the way the Jetson backend sends fills
+        epdconfig._write_fill(self.spi_writebyte2, value, count, epdconfig.FILL_CHUNK)
+
+    def module_init(self, cleanup=False, module_name=None):
+        return 0
+
+    def module_exit(self, cleanup=False):
+        pass
+
+
+def load(name, backend):
+    import waveshare_epd
+    sys.modules['waveshare_epd.epdconfig'] = backend
+    waveshare_epd.epdconfig = backend
+    module = importlib.import_module('waveshare_epd.' + name)
+    epd = module.EPD()
+    # The mock has no panel behind it, so never wait on BUSY
+    for attr in ('ReadBusy', 'ReadBusyH', 'ReadBusyL'):
+        if hasattr(epd, attr):
+            setattr(epd, attr, lambda: None)
+    return epd
+
+
+def measure(backend, func):
+    backend.transactions = backend.bytes = 0
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start, backend.transactions, backend.bytes
+
+
+def main():
+    backend = MockBackend()
+    print("%-12s %-8s %8s | %8s %9s | %8s %9s | %7s" % (
+        "driver", "call", "bytes", "legacy", "ms", "bulk", "ms", "speedup"))
+    for name in DRIVERS:
+        epd = load(name, backend)
+        frame = epd.getbuffer(Image.new('RGB', (epd.width, epd.height), (255, 255, 255)))
+        for call, func in (("display", lambda: epd.display(frame)), ("Clear", epd.Clear)):
+            t_new, n_new, size = measure(backend, func)
+            t_old, n_old, _ = measure(backend, lambda: [epd.send_data(0xFF) for _ in range(size)])
+            print("%-12s %-8s %8d | %8d %9.1f | %8d %9.1f | %6.0fx" % (
+                name, call, size, n_old, t_old * 1e3, n_new, t_new * 1e3, t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+from .epdpanels import get_panel, panels
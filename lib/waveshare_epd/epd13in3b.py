@@ -30,10 +30,13 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 960
 EPD_HEIGHT      = 680
+# SPI clock in Hz
+EPD_SPI_HZ      = 10000000
 
 GRAY1  = 0xff #white
 GRAY2  = 0xC0
@@ -43,50 +46,55 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, config=None):
+        self.config = epdconfig if config is None else config
+        self.reset_pin = self.config.RST_PIN
+        self.dc_pin = self.config.DC_PIN
+        self.busy_pin = self.config.BUSY_PIN
+        self.cs_pin = self.config.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(20) 
+        self.config.digital_write(self.reset_pin, 0)
+        self.config.delay_ms(2)
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 0)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([command])
+        self.config.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([data])
+        self.config.digital_write(self.cs_pin, 1)
 
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.SPI.writebytes2(data)
+        self.config.digital_write(self.cs_pin, 1)
+
+    # send one byte value many times
+    def send_fill(self, value, count):
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writefill(value, count)
+        self.config.digital_write(self.cs_pin, 1)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-            epdconfig.delay_ms(20)
-        epdconfig.delay_ms(20)
+        self.config.wait_for_pin(self.busy_pin, 0)
+        self.config.delay_ms(20)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
@@ -157,7 +165,7 @@ class EPD:
 
     def getbuffer(self, image):
         # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
+        buf = epdbuffer.FrameBuffer.filled(0xFF, int(self.width / 8) * self.height, self.width, self.height)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
         pixels = image_monocolor.load()
@@ -179,23 +187,27 @@ class EPD:
                         buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
         return buf
 
+    def getbuffer_color(self, image, accent=epdbuffer.TRICOLOR_RED, dither=False):
+        # Both planes for display() from one RGB image: black and red
+        return epdbuffer.split_tricolor(image, self.width, self.height, accent, dither)
+
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_fill(0xFF, (int(self.width/8) * self.height))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_fill(0x00, (int(self.width/8) * self.height))
 
         self.TurnOnDisplay()
 
     def Clear_Base(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_fill(0xFF, (int(self.width/8) * self.height))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_fill(0x00, (int(self.width/8) * self.height))
 
         self.TurnOnDisplay()
         self.send_command(0x26)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_fill(0xFF, (int(self.width/8) * self.height))
     
     def display(self, blackimage, ryimage):
         if(self.width % 8 == 0):
@@ -209,7 +221,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] ^= 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -227,7 +239,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] ^= 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -278,22 +290,16 @@ class EPD:
         self.send_data((Ystart>>8) & 0x01)
 
         self.send_command(0x24) 
-        for j in range(Height):
-            for i in range(Width):
-                if((j > Ystart-1) & (j < (Yend + 1)) & (i > Xstart-1) & (i < (Xend + 1))):
-                    self.send_data(Image[i + j * Width])
+        self.send_data2(epdbuffer.crop(Image, Width, Height, (Xstart * 8, Ystart, (Xend + 1) * 8, Yend + 1)))
         self.TurnOnDisplay_Part()
 
         self.send_command(0x26) 
-        for j in range(Height):
-            for i in range(Width):
-                if((j > Ystart-1) & (j < (Yend + 1)) & (i > Xstart-1) & (i < (Xend + 1))):
-                    self.send_data(Image[i + j * Width])
+        self.send_data2(epdbuffer.crop(Image, Width, Height, (Xstart * 8, Ystart, (Xend + 1) * 8, Yend + 1)))
 
     def sleep(self):
         self.send_command(0x10) # DEEP_SLEEP
         self.send_data(0x03)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.config.delay_ms(2000)
+        self.config.module_exit()
 ### END OF FILE ###
@@ -30,19 +30,23 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 80
 EPD_HEIGHT      = 128
+# SPI clock in Hz
+EPD_SPI_HZ      = 8000000
 
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, config=None):
+        self.config = epdconfig if config is None else config
+        self.reset_pin = self.config.RST_PIN
+        self.dc_pin = self.config.DC_PIN
+        self.busy_pin = self.config.BUSY_PIN
+        self.cs_pin = self.config.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
@@ -91,40 +95,49 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200) 
+        self.config.digital_write(self.reset_pin, 0)         # module reset
+        self.config.delay_ms(2)
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 0)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([command])
+        self.config.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([data])
+        self.config.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte2(data)
+        self.config.digital_write(self.cs_pin, 1)
         
+    # send one byte value many times
+    def send_fill(self, value, count):
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writefill(value, count)
+        self.config.digital_write(self.cs_pin, 1)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
         self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy =not(busy & 0x01)
-        while(busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy =not(busy & 0x01)
-        epdconfig.delay_ms(800)
+        self.config.wait_for_pin(self.busy_pin, 1)
+        self.config.delay_ms(800)
         logger.debug("e-Paper busy release")        
 
     def TurnOnDisplay(self):
         self.send_command(0x12)
-        epdconfig.delay_ms(10)
+        self.config.delay_ms(10)
         self.ReadBusy()
 
     def SetFulltReg(self):
@@ -146,7 +159,7 @@ class EPD:
             self.send_data(self.lut_b[count])     
 
     def Init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -239,7 +252,7 @@ class EPD:
         return 0
     
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
+        buf = epdbuffer.FrameBuffer.filled(0xFF, int(self.width / 8) * self.height, self.width, self.height)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
         pixels = image_monocolor.load()
@@ -270,14 +283,10 @@ class EPD:
             Width = self.width // 8 + 1
             
         self.send_command(0x10)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        self.send_fill(0xff, int(Width * self.height))
         
         self.send_command(0x13)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(image[i + j * int(Width)])  
+        self.send_data2(image)
         self.TurnOnDisplay()
         
     def Clear(self):
@@ -290,14 +299,10 @@ class EPD:
         Height = self.height
         
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0x00)  
+        self.send_fill(0x00, int(Width * Height))
         
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        self.send_fill(0xff, int(Width * Height))
         self.TurnOnDisplay()
 
     def DisplayPartial(self, old_Image, Image):
@@ -311,24 +316,13 @@ class EPD:
         self.send_data(0)
         self.send_data(127)  #y-end
         self.send_data(0x00)
-       
-        # Width = (self.width % 8 == 0)? (self.width // 8 ): (self.width // 8 + 1)
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 + 1
-            
-        Height = self.height
+
         # send data
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(old_Image[i + j * int(Width)])
+        self.send_data2(old_Image)
 
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(Image[i + j * int(Width)])
+        self.send_data2(Image)
 
         # Set partial refresh
         self.TurnOnDisplay()
@@ -340,10 +334,10 @@ class EPD:
         self.ReadBusy()
         self.send_command(0x07)
         self.send_data(0xA5)
-        epdconfig.delay_ms(200)
+        self.config.delay_ms(200)
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.config.delay_ms(2000)
+        self.config.module_exit()
 
 ### END OF FILE ###
 
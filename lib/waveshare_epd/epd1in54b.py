@@ -29,19 +29,23 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
 EPD_HEIGHT      = 200
+# SPI clock in Hz
+EPD_SPI_HZ      = 8000000
 
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, config=None):
+        self.config = epdconfig if config is None else config
+        self.reset_pin = self.config.RST_PIN
+        self.dc_pin = self.config.DC_PIN
+        self.busy_pin = self.config.BUSY_PIN
+        self.cs_pin = self.config.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
@@ -56,29 +60,28 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0) # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200) 
+        self.config.digital_write(self.reset_pin, 0) # module reset
+        self.config.delay_ms(5)
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 0)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([command])
+        self.config.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([data])
+        self.config.digital_write(self.cs_pin, 1)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):
-            epdconfig.delay_ms(100)    
+        self.config.wait_for_pin(self.busy_pin, 1)
         logger.debug("e-Paper busy release")
       
     def set_lut_bw(self):
@@ -110,7 +113,7 @@ class EPD:
             self.send_data(self.lut_red1[count])
             
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -146,7 +149,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
+        buf = epdbuffer.FrameBuffer.filled(0xFF, int(self.width * self.height / 8), self.width, self.height)
         # Set buffer to value of Python Imaging Library image.
         # Image must be in mode 1.
         image_monocolor = image.convert('1')
@@ -163,6 +166,10 @@ class EPD:
                     buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
         return buf
 
+    def getbuffer_color(self, image, accent=epdbuffer.TRICOLOR_RED, dither=False):
+        # Both planes for display() from one RGB image: black and red
+        return epdbuffer.split_tricolor(image, self.width, self.height, accent, dither)
+
     def display(self, blackimage, redimage):
         # send black data
         if (blackimage != None):
@@ -215,8 +222,8 @@ class EPD:
         
         self.send_command(0x02) # power off
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.config.delay_ms(2000)
+        self.config.module_exit()
 
 ### END OF FILE ###
 
@@ -30,10 +30,13 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 792
 EPD_HEIGHT      = 272
+# SPI clock in Hz
+EPD_SPI_HZ      = 10000000
 
 GRAY1  = 0xff #white
 GRAY2  = 0xC0
@@ -43,11 +46,12 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, config=None):
+        self.config = epdconfig if config is None else config
+        self.reset_pin = self.config.RST_PIN
+        self.dc_pin = self.config.DC_PIN
+        self.busy_pin = self.config.BUSY_PIN
+        self.cs_pin = self.config.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -99,64 +103,70 @@ class EPD:
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200) 
+        self.config.digital_write(self.reset_pin, 0)
+        self.config.delay_ms(1)
+        self.config.digital_write(self.reset_pin, 1)
+        self.config.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 0)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([command])
+        self.config.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte([data])
+        self.config.digital_write(self.cs_pin, 1)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writebyte2(data)
+        self.config.digital_write(self.cs_pin, 1)
         
+    # send one byte value many times
+    def send_fill(self, value, count):
+        self.config.digital_write(self.dc_pin, 1)
+        self.config.digital_write(self.cs_pin, 0)
+        self.config.spi_writefill(value, count)
+        self.config.digital_write(self.cs_pin, 1)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)
+        self.config.wait_for_pin(self.busy_pin, 0)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
         self.send_command(0x22)
         self.send_data(0xF7)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.config.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Fast(self):
         self.send_command(0x22)
         self.send_data(0xC7)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.config.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Partial(self):
         self.send_command(0x22)
         self.send_data(0xFF)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.config.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_4GRAY(self):
         self.send_command(0x22)
         self.send_data(0xCF)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.config.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def EPD_5in79_Lut(self):
@@ -177,7 +187,7 @@ class EPD:
         self.send_data(self.LUT_DATA_4Gray[232]) 
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
             
         self.reset()
@@ -228,7 +238,7 @@ class EPD:
         return 0
 
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
             
         self.reset()
@@ -296,7 +306,7 @@ class EPD:
         return 0
     
     def init_Partial(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
             
         self.reset()
@@ -310,7 +320,7 @@ class EPD:
         return 0
     
     def init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.config.module_init(module_name=__name__) != 0):
             return -1
             
         self.reset()
@@ -372,7 +382,7 @@ class EPD:
 
     def getbuffer(self, image):
         # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
+        buf = epdbuffer.FrameBuffer.filled(0xFF, int(self.width / 8) * self.height, self.width, self.height)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
         pixels = image_monocolor.load()
@@ -395,129 +405,90 @@ class EPD:
         return buf
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.pack_4gray(image, self.width, self.height)
 
-    def display(self, imageblack):
+    # Each controller drives half of every row, the master from byte 0 and
+    # the slave from byte Width - 1, so the halves share one byte column
+    def split_halves(self, image):
         Width =int(self.width / 16)+1
         Width1 =int(self.width / 8)
+        return epdbuffer.split_columns(image, Width1, self.height, (0, Width), (Width - 1, Width))
+
+    def display(self, imageblack):
+        master, slave = self.split_halves(imageblack)
         
         self.send_command(0x24)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 : i * Width1+Width])
+        self.send_data2(master)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.send_command(0xA4)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_data2(slave)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.TurnOnDisplay()
 
     def display_Base(self, imageblack):
-        Width =int(self.width / 16)+1
-        Width1 =int(self.width / 8)
+        master, slave = self.split_halves(imageblack)
         
         self.send_command(0x24)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 : i * Width1+Width])
+        self.send_data2(master)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.send_command(0xA4)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_data2(slave)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.TurnOnDisplay()
 
         self.send_command(0x26)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 : i * Width1+Width])
+        self.send_data2(master)
 
         self.send_command(0xA6)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_data2(slave)
 
     def display_Base_color(self, color):
         Width =int(self.width / 16)+1
         Width1 =int(self.width / 8)
         
         self.send_command(0x24)
-        self.send_data2([color] * 13600)
+        self.send_fill(color, 13600)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.send_command(0xA4)
-        self.send_data2([color] * 13600)
+        self.send_fill(color, 13600)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.TurnOnDisplay()
 
         self.send_command(0x26)
-        self.send_data2([color] * 13600)
+        self.send_fill(color, 13600)
 
         self.send_command(0xA6)
-        self.send_data2([color] * 13600)
+        self.send_fill(color, 13600)
 
     def display_Fast(self, imageblack):
-        Width =int(self.width / 16)+1
-        Width1 =int(self.width / 8)
+        master, slave = self.split_halves(imageblack)
         
         self.send_command(0x24)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 : i * Width1+Width])
+        self.send_data2(master)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.send_command(0xA4)
-        for i in range(self.height):
-            self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_data2(slave)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.TurnOnDisplay_Fast()
     
     def display_Partial(self, Image):
-        Width =int(self.width / 16)+1
-        Width1 =int(self.width / 8)
-        Height = self.height
+        master, slave = self.split_halves(Image)
         self.send_command(0x44)	 
         self.send_data(0x00)     						
         self.send_data(0x31) 
@@ -534,8 +505,7 @@ class EPD:
         self.send_data(0x01) 	
 
         self.send_command(0x24)
-        for i in range(Height):
-            self.send_data2(Image[i * Width1 : i * Width1+Width])
+        self.send_data2(master)
 
         self.send_command(0xC4)		    # Set Ram X- address Start / End position
         self.send_data(0x31)     		# XStart, POR = 00h
@@ -553,112 +523,31 @@ class EPD:
         self.send_data(0x01)
 
         self.send_command(0xA4)
-        for i in range(Height):
-            self.send_data2(Image[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_data2(slave)
 
         self.TurnOnDisplay_Partial()
 
 
     def display_4Gray(self, image):
-        Width =int(self.width / 16)+1
-        Width1 =int(self.width / 8)
-
-        self.send_command(0x24)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0x26)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
+        plane_24, plane_26 = epdbuffer.split_4gray(image, epdbuffer.GRAY4_LOW_BIT, epdbuffer.GRAY4_HIGH_BIT)
+        master_24, slave_24 = self.split_halves(plane_24)
+        master_26, slave_26 = self.split_halves(plane_26)
+        for command, half in ((0x24, master_24), (0x26, master_26), (0xA4, slave_24), (0xA6, slave_26)):
+            self.send_command(command)
+            self.send_data2(half)
 
-        self.send_command(0xA4)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0xA6)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-        
         self.TurnOnDisplay_4GRAY()
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * 13600)
+        self.send_fill(0xFF, 13600)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.send_command(0xA4)
-        self.send_data2([0xFF] * 13600)
+        self.send_fill(0xFF, 13600)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_fill(0x00, 13600)
 
         self.TurnOnDisplay()
 
@@ -666,7 +555,7 @@ class EPD:
         self.send_command(0X10) # deep sleep
         self.send_data(0x03)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.config.delay_ms(2000)
+        self.config.module_exit()
 ### END OF FILE ###
 
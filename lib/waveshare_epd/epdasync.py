@@ -0,0 +1,131 @@
+# *****************************************************************************
+# * | File        :	  epdasync.py
+# * | Function    :   asyncio facade for the panel drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   run the drivers on a thread of their own so refreshes
+# * |                 never block the event loop, with cancellation and
+# * |                 timeouts that take effect at the next busy wait
+# ******************************************************************************/
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import epdconfig
+from . import epdsession
+
+logger = logging.getLogger(__name__)
+
+# Longest stretch a busy wait runs before it checks for cancellation
+WAIT_SLICE_MS = 50
+
+
+class WaitCancelled(Exception):
+    """Raised inside the driver thread when the awaiting call was cancelled."""
+
+
+class AsyncPanel:
+    """Drive one panel from asyncio code: await panel.show(image).
+
+    epd is any driver instance such as epd2in66g.EPD(); it is kept in an
+    epdsession.DisplaySession, so init, deep sleep after idle_timeout and
+    skipping unchanged frames work as there. Frames are packed on the
+    default executor and the driver runs on one thread owned by the
+    panel, so calls are serialized and the event loop stays free while
+    the panel is busy.
+
+    Every call takes a timeout in seconds. A call that times out or is
+    cancelled stops the driver at its next busy wait (checked every
+    WAIT_SLICE_MS) and the cancellation is re-raised once the driver has
+    let go; the controller is inited again before the next frame.
+    """
+
+    def __init__(self, epd, idle_timeout=60.0):
+        self.session = epdsession.DisplaySession(epd, idle_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='epd')
+        self._cancel = threading.Event()
+        self._lock = None
+
+    @property
+    def epd(self):
+        return self.session.epd
+
+    async def show(self, image, timeout=None):
+        """Display a PIL image. Returns False when it was already on the panel."""
+        frame = await asyncio.get_running_loop().run_in_executor(None, self.session.pack, image)
+        return await self.show_frame(frame, timeout)
+
+    async def show_frame(self, frame, timeout=None):
+        """Display a frame from getbuffer, see DisplaySession.show_frame."""
+        return await self.run(self.session.show_frame, frame, timeout=timeout)
+
+    async def clear(self, timeout=None):
+        return await self.run(self.session.clear, timeout=timeout)
+
+    async def wake(self, timeout=None):
+        return await self.run(self.session.wake, timeout=timeout)
+
+    async def sleep(self, timeout=None):
+        return await self.run(self.session.sleep, timeout=timeout)
+
+    async def close(self):
+        """Put the panel to sleep and stop its thread."""
+        try:
+            await self.run(self.session.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def run(self, func, *args, timeout=None):
+        """Run func(*args) on the panel thread, e.g. a driver method the
+        facade does not wrap, and return its result."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._cancel.clear()
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._call, func, args)
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                self._cancel.set()
+                # Hold the panel until the driver has unwound, so the next
+                # call does not interleave with a half-sent sequence
+                await asyncio.wait([future])
+                # The WaitCancelled it ended with is the expected outcome
+                future.exception()
+                raise
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+    def _call(self, func, args):
+        epdconfig.set_wait_hook(self._wait)
+        try:
+            return func(*args)
+        except WaitCancelled:
+            logger.debug("async: call cancelled during a busy wait")
+            # The controller stopped half way through a command sequence
+            self.session.initialized = False
+            self.session.last_frame = None
+            raise
+
+    def _wait(self, wait, pin, level, timeout_ms):
+        # The driver's busy wait, cut into slices with a cancellation
+        # check in between
+        remaining_ms = timeout_ms
+        while True:
+            if self._cancel.is_set():
+                raise WaitCancelled("busy wait on pin %d cancelled" % pin)
+            slice_ms = WAIT_SLICE_MS if remaining_ms is None else min(WAIT_SLICE_MS, remaining_ms)
+            if wait(pin, level, slice_ms):
+                return True
+            if remaining_ms is not None:
+                remaining_ms -= slice_ms
+                if remaining_ms <= 0:
+                    return False
+
+### END OF FILE ###
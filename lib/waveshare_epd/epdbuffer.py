@@ -0,0 +1,415 @@
+# *****************************************************************************
+# * | File        :	  epdbuffer.py
+# * | Function    :   Frame buffer packing shared by the panel drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   pack palette indices into the byte layout the
+# * |                 controllers expect, without per-pixel Python loops
+# ******************************************************************************/
+
+import numpy as np
+from PIL import Image
+# Pixel formats and panel palettes live with the panel descriptors
+from .epdpanels import FORMAT_1BPP, FORMAT_2BPP, FORMAT_4BPP, FORMAT_DUAL
+from .epdpanels import PALETTE_4COLOR, PALETTE_7COLOR
+
+
+_FORMAT_BITS = {FORMAT_1BPP: 1, FORMAT_2BPP: 2, FORMAT_4BPP: 4, FORMAT_DUAL: 1}
+
+
+class FrameBuffer(bytearray):
+    """A panel frame: the bytes sent to the controller plus their layout.
+
+    It is a bytearray, so the transports, NumPy and bytes() use it in
+    place, and it indexes like the lists of ints the drivers used to
+    return. Like spidev did with those lists, stores keep the low 8 bits,
+    so old code writing ~x into a frame still works. width and height
+    are in pixels, in panel orientation.
+    """
+
+    __slots__ = ('format', 'width', 'height')
+
+    def __init__(self, data=b'', width=0, height=0, format=FORMAT_1BPP):
+        try:
+            super().__init__(data)
+        except ValueError:
+            super().__init__(value & 0xFF for value in data)
+        self.format = format
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def filled(cls, fill, length, width, height, format=FORMAT_1BPP):
+        """A frame of length bytes that all hold fill."""
+        return cls(bytes((fill,)) * length, width, height, format)
+
+    @classmethod
+    def dual(cls, first, second, width, height):
+        """One FORMAT_DUAL frame from two 1bpp planes of the same size."""
+        return cls(bytes(first) + bytes(second), width, height, FORMAT_DUAL)
+
+    @property
+    def stride(self):
+        # Bytes per row of one plane
+        return (self.width * _FORMAT_BITS[self.format] + 7) // 8
+
+    def planes(self):
+        """The planes as memoryviews: two for FORMAT_DUAL, else the frame itself."""
+        view = memoryview(self)
+        if self.format != FORMAT_DUAL:
+            return (view,)
+        half = len(self) // 2
+        return view[:half], view[half:]
+
+    def copy(self):
+        return FrameBuffer(self, self.width, self.height, self.format)
+
+    def __setitem__(self, index, value):
+        try:
+            super().__setitem__(index, value)
+        except ValueError:
+            if isinstance(index, slice):
+                value = [v & 0xFF for v in value]
+            else:
+                value &= 0xFF
+            super().__setitem__(index, value)
+
+    def __repr__(self):
+        return '<FrameBuffer %s %dx%d, %d bytes>' % (self.format, self.width, self.height, len(self))
+
+
+def _index_rows(indices, width, height):
+    # View a row-major buffer of one-byte palette indices as (height, width)
+    return np.frombuffer(indices, dtype=np.uint8, count=width * height).reshape(height, width)
+
+
+def pack_1bpp(image, width, height):
+    """Pack a PIL image into a 1bpp frame, first pixel in the most significant bit.
+
+    The image is either width x height, or height x width for landscape
+    use, in which case it is turned by PIL rotate(90) into the panel
+    orientation. Black pixels clear their bit, all others set it. Rows
+    are padded with white up to a whole byte. An image of any other size
+    gives an all-white frame. Returns a FrameBuffer of
+    ceil(width / 8) * height bytes.
+    """
+    image_monocolor = _panel_orientation(image.convert('1'), width, height)
+    if image_monocolor is None:
+        return FrameBuffer.filled(0xFF, (width + 7) // 8 * height, width, height)
+    return _pack_ink(np.logical_not(np.asarray(image_monocolor, dtype=bool)))
+
+
+def _panel_orientation(image, width, height):
+    # The image turned into width x height like rotate(90), or None when
+    # it has neither orientation
+    if image.size == (height, width) and width != height:
+        return image.rotate(90, expand=True)
+    if image.size != (width, height):
+        return None
+    return image
+
+
+def _pack_ink(ink, ink_bit=0):
+    # Bit-pack a (height, width) bool array, first pixel in the MSB. Ink
+    # pixels get ink_bit, the rest and the row padding the other value;
+    # packbits pads with 0 bits, so pack the ink and invert for ink_bit 0
+    packed = np.packbits(ink, axis=1)
+    if not ink_bit:
+        packed = np.invert(packed)
+    return FrameBuffer(packed.tobytes(), ink.shape[1], ink.shape[0])
+
+
+def pack_2bpp(indices, width, height):
+    """Pack 2-bit palette indices four pixels per byte, first pixel in the high bits.
+
+    Each row is padded with index 0 up to a whole byte, so panels whose
+    width is not a multiple of 4 keep the line stride the controller uses.
+    Returns a FrameBuffer of ceil(width / 4) * height bytes.
+    """
+    pixels = _index_rows(indices, width, height)
+    pad = -width % 4
+    if pad:
+        pixels = np.pad(pixels, ((0, 0), (0, pad)))
+    pixels = pixels.reshape(height, -1, 4)
+    packed = (pixels[..., 0] << 6) | (pixels[..., 1] << 4) | (pixels[..., 2] << 2) | pixels[..., 3]
+    return FrameBuffer(packed.tobytes(), width, height, FORMAT_2BPP)
+
+
+def pack_4bpp(indices, width, height):
+    """Pack 4-bit palette indices two pixels per byte, first pixel in the high nibble.
+
+    Rows are padded with index 0 up to a whole byte. Returns a FrameBuffer
+    of ceil(width / 2) * height bytes.
+    """
+    pixels = _index_rows(indices, width, height)
+    if width % 2:
+        pixels = np.pad(pixels, ((0, 0), (0, 1)))
+    pixels = pixels.reshape(height, -1, 2)
+    packed = (pixels[..., 0] << 4) | pixels[..., 1]
+    return FrameBuffer(packed.tobytes(), width, height, FORMAT_4BPP)
+
+
+# 2-bit level of every 8-bit gray. The 4-gray waveforms expect 0xC0 to be
+# sent as 0x80 and 0x80 as 0x40, then keep the two high bits
+_GRAY4_LEVELS = np.arange(256, dtype=np.uint8) >> 6
+_GRAY4_LEVELS[0xC0] = 0x80 >> 6
+_GRAY4_LEVELS[0x80] = 0x40 >> 6
+
+
+def pack_4gray(image, width, height, transpose=False):
+    """Encode a PIL image as a 4-gray frame, four pixels per byte, first pixel in the high bits.
+
+    GRAY1..GRAY4 (0xFF, 0xC0, 0x80, 0x00) become levels 3..0. The image
+    is either width x height or height x width; the latter is turned
+    into panel orientation like rotate(90), or transposed when transpose
+    is set (the layout epd4in2 and epd4in2_V2 use). An image of any
+    other size gives an all-0xFF frame. Returns a FrameBuffer of
+    ceil(width / 4) * height bytes.
+    """
+    gray = image.convert('L')
+    if gray.size == (height, width) and width != height:
+        pixels = np.asarray(gray, dtype=np.uint8)
+        pixels = pixels.T if transpose else np.rot90(pixels)
+    elif gray.size == (width, height):
+        pixels = np.asarray(gray, dtype=np.uint8)
+    else:
+        return FrameBuffer.filled(0xFF, (width + 3) // 4 * height, width, height, FORMAT_2BPP)
+    return pack_2bpp(np.ascontiguousarray(_GRAY4_LEVELS[pixels]), width, height)
+
+
+# Bit each 4-gray level 0..3 (black, 0x80, 0xC0, white) sets in a RAM
+# plane. Controllers differ in which level bit goes to which RAM and in
+# whether it is inverted
+GRAY4_HIGH_BIT     = (0, 0, 1, 1)
+GRAY4_LOW_BIT      = (0, 1, 0, 1)
+GRAY4_NOT_HIGH_BIT = (1, 1, 0, 0)
+GRAY4_NOT_LOW_BIT  = (1, 0, 1, 0)
+
+_split_tables = {}
+
+
+def _split_table(first, second):
+    # Per 2bpp byte: the four first-plane bits in the high nibble, the
+    # four second-plane bits in the low one
+    table = _split_tables.get((first, second))
+    if table is None:
+        levels = np.arange(256, dtype=np.uint8)[:, None] >> np.array([6, 4, 2, 0], dtype=np.uint8) & 3
+        weights = np.array([8, 4, 2, 1], dtype=np.uint8)
+        high = (np.array(first, dtype=np.uint8)[levels] * weights).sum(axis=1)
+        low = (np.array(second, dtype=np.uint8)[levels] * weights).sum(axis=1)
+        table = _split_tables[(first, second)] = (high << 4 | low).astype(np.uint8)
+    return table
+
+
+def _byte_array(frame):
+    # uint8 array over a bytes-like frame, used in place; a list of ints is
+    # copied, keeping the low 8 bits of each like the SPI transports do
+    try:
+        return np.frombuffer(frame, dtype=np.uint8)
+    except TypeError:
+        return (np.asarray(frame, dtype=np.int64) & 0xFF).astype(np.uint8)
+
+
+def invert(frame, length=None):
+    """The bitwise NOT of frame, or of its first length bytes, as a new FrameBuffer.
+
+    This is what the drivers sent as ~frame[i] byte by byte, e.g. the
+    "old" RAM plane of a UC81xx controller. A FrameBuffer keeps its
+    width, height and format.
+    """
+    inverted = np.invert(_byte_array(frame)[:length])
+    return FrameBuffer(inverted.tobytes(), getattr(frame, 'width', 0), getattr(frame, 'height', 0),
+                       getattr(frame, 'format', FORMAT_1BPP))
+
+
+def split_4gray(frame, first, second):
+    """Split a 4-gray frame into the two 1bpp planes the controller RAMs take.
+
+    frame is the 2bpp output of pack_4gray (or a list of the same bytes).
+    first and second give the bit each level sets in the respective
+    plane, e.g. GRAY4_HIGH_BIT. Both planes come out of one table lookup
+    per input byte. Returns (first_plane, second_plane) as bytearrays of
+    len(frame) // 2 bytes.
+    """
+    data = _byte_array(frame)
+    pairs = _split_table(tuple(first), tuple(second))[data[:len(data) // 2 * 2]].reshape(-1, 2)
+    first_plane = (pairs[:, 0] & 0xF0) | (pairs[:, 1] >> 4)
+    second_plane = (pairs[:, 0] << 4) | (pairs[:, 1] & 0x0F)
+    return bytearray(first_plane.tobytes()), bytearray(second_plane.tobytes())
+
+
+def split_columns(frame, row_bytes, height, *spans):
+    """Cut byte columns out of every row of a frame, each as one contiguous buffer.
+
+    frame holds height rows of row_bytes bytes. Each span is a (first
+    byte, byte count) pair; spans may overlap, like the shared middle
+    column of the two controllers of epd5in79. Every span is one strided
+    NumPy view copied out at once. Returns a tuple of bytes, one per span.
+    A frame shorter than height rows raises ValueError.
+    """
+    rows = _frame_rows(frame, row_bytes, height)
+    return tuple(rows[:, start:start + count].tobytes() for start, count in spans)
+
+
+def _frame_rows(frame, row_bytes, height):
+    # The first height rows of frame as a (height, row_bytes) array
+    data = _byte_array(frame)
+    if len(data) < row_bytes * height:
+        raise ValueError("frame has %d bytes, expected %d rows of %d" % (len(data), height, row_bytes))
+    return data[:row_bytes * height].reshape(height, row_bytes)
+
+
+def dirty_rects(previous, frame, row_bytes, height, row_gap=16):
+    """Bounding boxes of the pixels that differ between two 1bpp frames.
+
+    Both frames hold height rows of row_bytes bytes. The frames are XORed
+    as whole arrays; changed rows closer than row_gap unchanged rows
+    apart share a box, so a few scattered edits don't turn into dozens of
+    tiny refreshes. Each box is (x0, y0, x1, y1) in pixels with the ends
+    exclusive and x0/x1 on byte boundaries, the unit the controllers
+    address RAM in. Returns [] when the frames are equal.
+    """
+    changed = np.bitwise_xor(_frame_rows(previous, row_bytes, height), _frame_rows(frame, row_bytes, height))
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not rows.size:
+        return []
+    # Split the changed rows into runs wherever the gap is too wide
+    breaks = np.flatnonzero(np.diff(rows) > row_gap + 1)
+    firsts = rows[np.concatenate(([0], breaks + 1))]
+    lasts = rows[np.concatenate((breaks, [rows.size - 1]))]
+    boxes = []
+    for first, last in zip(firsts.tolist(), lasts.tolist()):
+        columns = np.flatnonzero(changed[first:last + 1].any(axis=0))
+        boxes.append((int(columns[0]) * 8, first, (int(columns[-1]) + 1) * 8, last + 1))
+    return boxes
+
+
+def crop(frame, row_bytes, height, box):
+    """The bytes of a 1bpp frame inside box, row by row, as one buffer.
+
+    box is (x0, y0, x1, y1) in pixels like dirty_rects returns; x is
+    widened to whole bytes. This is the window data a controller takes
+    after its RAM window has been set to the same box.
+    """
+    x0, y0, x1, y1 = box
+    rows = _frame_rows(frame, row_bytes, height)
+    return rows[y0:y1, x0 // 8:(x1 + 7) // 8].tobytes()
+
+
+# Colors split_tricolor tells apart
+TRICOLOR_WHITE = (255, 255, 255)
+TRICOLOR_BLACK = (0, 0, 0)
+TRICOLOR_RED = (255, 0, 0)
+TRICOLOR_YELLOW = (255, 255, 0)
+
+
+def split_tricolor(image, width, height, accent=TRICOLOR_RED, dither=False, ink_bit=0):
+    """Split one image into the black and the accent plane of a tri-color panel.
+
+    Every pixel goes to the nearest of white, black and accent (red or
+    yellow, whichever the panel has), by squared RGB distance. With
+    dither the same three colors are reached by Floyd-Steinberg error
+    diffusion instead. Orientation and bit layout follow pack_1bpp; ink
+    pixels get ink_bit in their plane. An image of any other size gives
+    two blank planes. Returns (black_plane, accent_plane) as FrameBuffers.
+    """
+    rgb = _panel_orientation(image.convert('RGB'), width, height)
+    if rgb is None:
+        blank = 0x00 if ink_bit else 0xFF
+        length = (width + 7) // 8 * height
+        return FrameBuffer.filled(blank, length, width, height), FrameBuffer.filled(blank, length, width, height)
+    palette = (TRICOLOR_WHITE, TRICOLOR_BLACK, tuple(accent))
+    if dither:
+        # Pad with white so no unused entry can win
+        pal_image = palette_image(palette, pad=TRICOLOR_WHITE)
+        indices = np.asarray(rgb.quantize(palette=pal_image, dither=Image.FLOYDSTEINBERG))
+        indices = np.where(indices < len(palette), indices, 0)
+    else:
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 is the same for every
+        # c, so one matrix product ranks the colors. float32 holds these
+        # integer sums exactly
+        pixels = np.asarray(rgb, dtype=np.float32)
+        colors = np.array(palette, dtype=np.float32)
+        indices = ((colors ** 2).sum(axis=1) - 2 * pixels @ colors.T).argmin(axis=2)
+    return _pack_ink(indices == 1, ink_bit), _pack_ink(indices == 2, ink_bit)
+
+
+# Bits of each RGB channel the lookup table resolves, 32 cells per axis
+LUT_BITS = 5
+
+_palette_images = {}
+_palette_luts = {}
+
+
+def palette_image(palette, pad=(0, 0, 0)):
+    """The "P" image quantize(palette=...) takes for palette, built once per palette.
+
+    The unused entries of the 256 are filled with pad.
+    """
+    key = (tuple(tuple(color) for color in palette), tuple(pad))
+    pal_image = _palette_images.get(key)
+    if pal_image is None:
+        pal_image = Image.new("P", (1, 1))
+        pal_image.putpalette(sum(key[0], ()) + key[1] * (256 - len(palette)))
+        _palette_images[key] = pal_image
+    return pal_image
+
+
+def palette_lut(palette):
+    """The nearest palette index of every RGB cell, built on first use per palette.
+
+    The table is indexed [r >> 3, g >> 3, b >> 3] (for LUT_BITS 5) and
+    holds the index of the color closest, by squared RGB distance, to the
+    center of that cell; on ties the first entry wins. 32 KiB per palette.
+    """
+    palette = tuple(tuple(color) for color in palette)
+    lut = _palette_luts.get(palette)
+    if lut is None:
+        shift = 8 - LUT_BITS
+        centers = (np.arange(1 << LUT_BITS, dtype=np.float32) * (1 << shift)) + ((1 << shift) - 1) / 2
+        cells = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1)
+        colors = np.array(palette, dtype=np.float32)
+        # Same ranking as split_tricolor: |c|^2 - 2 p.c
+        lut = ((colors ** 2).sum(axis=1) - 2 * cells @ colors.T).argmin(axis=-1).astype(np.uint8)
+        _palette_luts[palette] = lut
+    return lut
+
+
+def quantize(image, palette, dither=True):
+    """Map a PIL image to palette indices, one byte per pixel in row-major order.
+
+    This is PIL quantize(palette=...) against the cached palette_image,
+    with Floyd-Steinberg error diffusion unless dither is False. Without
+    dither image may also be an (height, width, 3) uint8 array, e.g. a
+    camera frame; every pixel then takes the entry palette_lut gives its
+    RGB cell, which is a single array indexing operation. Returns bytes.
+    """
+    if isinstance(image, Image.Image):
+        return image.convert("RGB").quantize(palette=palette_image(palette),
+                                             dither=Image.FLOYDSTEINBERG if dither else Image.NONE).tobytes('raw')
+    pixels = np.asarray(image, dtype=np.uint8)
+    shift = 8 - LUT_BITS
+    # One flat cell number per pixel, r in the high bits
+    cells = (pixels[..., 0] >> shift).astype(np.uint16) << (2 * LUT_BITS)
+    cells |= (pixels[..., 1] >> shift).astype(np.uint16) << LUT_BITS
+    cells |= pixels[..., 2] >> shift
+    return palette_lut(palette).ravel().take(cells).tobytes()
+
+
+def match_palette(rgb, width, height, palette):
+    """Map an RGB buffer to palette indices by exact color match.
+
+    palette is a sequence of (r, g, b) tuples; pixels that match none of
+    them get index 0. Returns the indices as bytes, one per pixel.
+    """
+    pixels = np.frombuffer(rgb, dtype=np.uint8, count=width * height * 3).reshape(-1, 3).astype(np.uint32)
+    keys = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+    indices = np.zeros(width * height, dtype=np.uint8)
+    # Walk the palette backwards so the first entry wins on duplicates
+    for index in range(len(palette) - 1, -1, -1):
+        r, g, b = palette[index]
+        indices[keys == ((r << 16) | (g << 8) | b)] = index
+    return indices.tobytes()
+
+### END OF FILE ###
@@ -0,0 +1,87 @@
+# *****************************************************************************
+# * | File        :	  epdcalibrate.py
+# * | Function    :   SPI clock calibration for the panel drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   push a test frame at rising clocks and keep the
+# * |                 fastest one the panel still receives cleanly
+# ******************************************************************************/
+
+import logging
+from . import epdconfig
+
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_SPEEDS_HZ = (4000000, 8000000, 10000000, 16000000, 20000000, 32000000)
+
+
+def test_image(width, height):
+    # One-pixel checkerboard with solid bands, so every data bit toggles
+    # and long runs of equal bytes are covered too
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    pixels = image.load()
+    for y in range(height):
+        for x in range(y % 2, width, 2):
+            pixels[x, y] = (0, 0, 0)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width - 1, height // 8), fill=(0, 0, 0))
+    draw.rectangle((0, height - 1 - height // 8, width - 1, height - 1), fill=(255, 255, 255))
+    return image
+
+
+def calibrate_spi_speed(epd, speeds_hz=CALIBRATION_SPEEDS_HZ, init=None, show=None, verify=None, apply=True):
+    """Find the fastest SPI clock in speeds_hz at which a test frame verifies.
+
+    The clocks are tried in rising order and the search stops at the
+    first one that fails. Every step runs init() and show(image), which
+    refreshes the panel. init defaults to epd.init and show to
+    epd.display(epd.getbuffer(image)); pass your own for drivers whose
+    init or display take more arguments.
+
+    verify(hz) returns True when the panel got the frame intact. Without
+    it the controller RAM is read back, which only the virtual backend
+    can do: the RAM written at the slowest clock is the reference the
+    faster ones must match.
+
+    Only the backend of epd is switched, other open panels keep their
+    clock. Returns the chosen clock, or None when even the slowest one
+    fails. With apply the result is pinned through
+    epdconfig.set_panel_spi_speed; otherwise, or when no clock passes,
+    the backend goes back to the clock it had before.
+    """
+    init = init or epd.init
+    show = show or (lambda image: epd.display(epd.getbuffer(image)))
+    read_ram = getattr(epd.config, 'read_ram', None)
+    if verify is None and read_ram is None:
+        raise RuntimeError("%s backend cannot read the panel RAM back, pass verify"
+                           % epdconfig.detect_platform())
+    module_name = type(epd).__module__
+    image = test_image(epd.width, epd.height)
+    reference = None
+    best = None
+    previous = epdconfig.set_panel_spi_speed(epd.config, None, module_name)
+    for hz in sorted(speeds_hz):
+        epdconfig.set_panel_spi_speed(epd.config, hz, module_name)
+        init()
+        show(image)
+        if verify is None and reference is None:
+            # Again, so RAM that holds the previous frame holds this one too
+            show(image)
+        if verify is not None:
+            ok = verify(hz)
+        elif reference is None:
+            reference = read_ram()
+            ok = True
+        else:
+            ok = read_ram() == reference
+        logger.debug("SPI clock %d Hz: %s", hz, "ok" if ok else "failed")
+        if not ok:
+            break
+        best = hz
+    epdconfig.set_panel_spi_speed(epd.config, best if apply and best is not None else previous, module_name)
+    return best
+
+### END OF FILE ###
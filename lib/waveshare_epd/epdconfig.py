@@ -30,13 +30,200 @@
 import os
 import logging
 import sys
+import re
 import time
-import subprocess
+import threading
+import collections
+import weakref
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# Poll interval for backends or pins that cannot wait on a GPIO edge
+POLL_INTERVAL_MS = 5
+# Longest single edge wait. The level is re-read after each one, which
+# bounds the cost of an edge that fires between the read and the wait
+EDGE_SLICE_MS = 100
+
+# SPI clock for drivers that do not declare EPD_SPI_HZ
+DEFAULT_SPI_HZ = 4000000
+_spi_hz_override = None
+
+# Longest run of one byte spi_writefill hands to a transport at a time
+FILL_CHUNK = 4096
+_fills = {}
+
+# Per-instance options of the backends, mapped to the class attribute
+# each one overrides
+_OPTIONS = {
+    'rst_pin': 'RST_PIN',
+    'dc_pin': 'DC_PIN',
+    'cs_pin': 'CS_PIN',
+    'busy_pin': 'BUSY_PIN',
+    'pwr_pin': 'PWR_PIN',
+    'spi_bus': 'SPI_BUS',
+    'spi_device': 'SPI_DEVICE',
+    'spi_hz': 'SPI_HZ',
+}
+# Every backend built, so a new SPI clock reaches the open ones
+_backends = weakref.WeakSet()
+
+
+def _byte_view(data):
+    # Flat memoryview of unsigned bytes over data. bytes, bytearray,
+    # memoryview and contiguous uint8 NumPy arrays are used in place;
+    # lists and wider element types are converted once
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return memoryview(_low_bytes(data))
+    if view.itemsize != 1:
+        flat = view.cast('B').cast(view.format) if view.c_contiguous else memoryview(view.tobytes()).cast(view.format)
+        return memoryview(_low_bytes(flat.tolist()))
+    if view.ndim != 1 or view.format != 'B':
+        view = view.cast('B') if view.c_contiguous else memoryview(view.tobytes())
+    return view
+
+
+def _low_bytes(values):
+    # spidev keeps the low 8 bits of every value, and drivers rely on it
+    # when they send ~x for an inverted byte
+    try:
+        return bytes(values)
+    except ValueError:
+        return bytes(value & 0xFF for value in values)
+
+
+def fill_bytes(value, length):
+    """length bytes of value as immutable bytes, built once per (value, length)."""
+    key = (value & 0xFF, length)
+    data = _fills.get(key)
+    if data is None:
+        data = _fills[key] = bytes((key[0],)) * length
+    return data
+
+
+def _write_fill(write, value, count, chunk):
+    # count bytes of value through write, as slices of one cached run of
+    # at most chunk bytes
+    if count <= 0:
+        return
+    run = memoryview(fill_bytes(value, min(count, chunk)))
+    for _ in range(count // len(run)):
+        write(run)
+    if count % len(run):
+        write(run[:count % len(run)])
+
+
+def _spidev_bufsiz():
+    # spidev rejects single transfers larger than its bufsiz parameter
+    try:
+        return int(_read_text('/sys/module/spidev/parameters/bufsiz'))
+    except ValueError:
+        return 4096
+
+
+def set_spi_speed(hz):
+    """Pin the SPI clock for every panel, ahead of EPD_SPI_HZ and the driver setting.
+
+    None goes back to the per-panel clock. An open bus switches at once,
+    otherwise the clock applies from the next module_init.
+    """
+    global _spi_hz_override
+    _spi_hz_override = None if hz is None else int(hz)
+    if hz is not None:
+        for backend in list(_backends):
+            if hasattr(getattr(backend, 'SPI', None), 'max_speed_hz'):
+                backend.SPI.max_speed_hz = backend.SPI_HZ or _spi_hz_override
+
+
+def set_panel_spi_speed(config, hz, module_name=None):
+    """Pin the SPI clock of one backend, ahead of set_spi_speed.
+
+    config is what a driver holds in self.config: a backend from create()
+    or this module for the shared one. None goes back to
+    spi_speed(module_name). An open bus switches at once. Returns the
+    clock pinned before, None when there was none.
+    """
+    backend = _build() if config is sys.modules[__name__] else config
+    previous = backend.SPI_HZ
+    backend.SPI_HZ = None if hz is None else int(hz)
+    if hasattr(getattr(backend, 'SPI', None), 'max_speed_hz'):
+        backend.SPI.max_speed_hz = spi_speed(module_name, backend)
+    return previous
+
+
+def spi_speed(module_name=None, backend=None):
+    """SPI clock in Hz for the driver module module_name.
+
+    The clock pinned on backend by set_panel_spi_speed() wins, then
+    set_spi_speed(), then the EPD_SPI_HZ environment variable, then the
+    EPD_SPI_HZ constant of the driver, then DEFAULT_SPI_HZ.
+    """
+    if getattr(backend, 'SPI_HZ', None) is not None:
+        return backend.SPI_HZ
+    if _spi_hz_override is not None:
+        return _spi_hz_override
+    if os.environ.get('EPD_SPI_HZ'):
+        return int(os.environ['EPD_SPI_HZ'])
+    return getattr(sys.modules.get(module_name or ''), 'EPD_SPI_HZ', DEFAULT_SPI_HZ)
+
+
+def _configure(backend, options):
+    # Apply the per-instance options over the class defaults. pwr_pin=None
+    # is a panel without a power switch of its own, e.g. a second panel
+    # powered from the first one's HAT
+    for name, value in options.items():
+        if name not in _OPTIONS:
+            raise TypeError("unknown backend option %r" % name)
+        setattr(backend, _OPTIONS[name], value)
+    backend.wait_for_pin = _hooked_wait(backend.wait_for_pin)
+    _backends.add(backend)
+
+
+def _bind_software_spi(lib):
+    # Per-byte transfer of sysfs_software_spi.so, plus the bulk writer when
+    # the library exports
+    #   void SYSFS_software_spi_writebytes(const uint8_t *buf, uint32_t len)
+    try:
+        writebytes = lib.SYSFS_software_spi_writebytes
+    except AttributeError:
+        return lib.SYSFS_software_spi_transfer, None
+    writebytes.argtypes = [c_void_p, c_uint32]
+    writebytes.restype = None
+    return lib.SYSFS_software_spi_transfer, writebytes
+
+
+def _poll_for_pin(backend, pin, level, timeout_ms):
+    deadline = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000.0
+    while backend.digital_read(pin) != level:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        backend.delay_ms(POLL_INTERVAL_MS)
+    return True
+
+
+def _wait_for_edge(backend, pin, level, timeout_ms):
+    # Jetson.GPIO and Hobot.GPIO share the RPi.GPIO event API
+    GPIO = backend.GPIO
+    edge = GPIO.RISING if level else GPIO.FALLING
+    deadline = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000.0
+    while backend.digital_read(pin) != level:
+        slice_ms = EDGE_SLICE_MS
+        if deadline is not None:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return False
+            slice_ms = min(slice_ms, remaining_ms)
+        try:
+            GPIO.wait_for_edge(pin, edge, timeout=slice_ms)
+        except (AttributeError, RuntimeError, ValueError) as e:
+            logger.debug("edge wait unavailable on pin %d (%s), polling", pin, e)
+            remaining_ms = None if deadline is None else max(0, (deadline - time.monotonic()) * 1000)
+            return _poll_for_pin(backend, pin, level, remaining_ms)
+    return True
+
 
 class RaspberryPi:
     # Pin definition
@@ -47,16 +234,21 @@ class RaspberryPi:
     PWR_PIN  = 18
     MOSI_PIN = 10
     SCLK_PIN = 11
+    SPI_BUS  = 0
+    SPI_DEVICE = 0
+    SPI_HZ   = None
 
-    def __init__(self):
+    def __init__(self, **options):
         import spidev
         import gpiozero
         
+        _configure(self, options)
         self.SPI = spidev.SpiDev()
+        self.spi_bufsiz = _spidev_bufsiz()
         self.GPIO_RST_PIN    = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN     = gpiozero.LED(self.DC_PIN)
         # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
-        self.GPIO_PWR_PIN    = gpiozero.LED(self.PWR_PIN)
+        self.GPIO_PWR_PIN    = None if self.PWR_PIN is None else gpiozero.LED(self.PWR_PIN)
         self.GPIO_BUSY_PIN   = gpiozero.Button(self.BUSY_PIN, pull_up = False)
 
         
@@ -95,6 +287,16 @@ class RaspberryPi:
         elif pin == self.PWR_PIN:
             return self.PWR_PIN.value
 
+    def wait_for_pin(self, pin, level, timeout_ms=None):
+        """Block until pin reads level, False if timeout_ms elapses first."""
+        if pin != self.BUSY_PIN:
+            return _poll_for_pin(self, pin, level, timeout_ms)
+        timeout = None if timeout_ms is None else timeout_ms / 1000.0
+        # gpiozero sets these events from its edge callback thread
+        if level:
+            return self.GPIO_BUSY_PIN.wait_for_active(timeout)
+        return self.GPIO_BUSY_PIN.wait_for_inactive(timeout)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -102,7 +304,13 @@ class RaspberryPi:
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
+        # Stream kernel-sized slices of one view, no per-chunk copies
+        view = _byte_view(data)
+        for start in range(0, len(view), self.spi_bufsiz):
+            self.SPI.writebytes2(view[start:start + self.spi_bufsiz])
+
+    def spi_writefill(self, value, count):
+        _write_fill(self.SPI.writebytes2, value, count, self.spi_bufsiz)
 
     def DEV_SPI_write(self, data):
         self.DEV_SPI.DEV_SPI_SendData(data)
@@ -113,8 +321,9 @@ class RaspberryPi:
     def DEV_SPI_read(self):
         return self.DEV_SPI.DEV_SPI_ReadData()
 
-    def module_init(self, cleanup=False):
-        self.GPIO_PWR_PIN.on()
+    def module_init(self, cleanup=False, module_name=None):
+        if self.GPIO_PWR_PIN is not None:
+            self.GPIO_PWR_PIN.on()
         
         if cleanup:
             find_dirs = [
@@ -123,9 +332,9 @@ class RaspberryPi:
                 '/usr/lib',
             ]
             self.DEV_SPI = None
+            val = 64 if sys.maxsize > 2**32 else 32
+            logging.debug("System is %d bit"%val)
             for find_dir in find_dirs:
-                val = int(os.popen('getconf LONG_BIT').read())
-                logging.debug("System is %d bit"%val)
                 if val == 64:
                     so_filename = os.path.join(find_dir, 'DEV_Config_64.so')
                 else:
@@ -139,9 +348,9 @@ class RaspberryPi:
             self.DEV_SPI.DEV_Module_Init()
 
         else:
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(0, 0)
-            self.SPI.max_speed_hz = 4000000
+            # SPI device, bus = 0, device = 0 unless configured
+            self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+            self.SPI.max_speed_hz = spi_speed(module_name, self)
             self.SPI.mode = 0b00
         return 0
 
@@ -151,14 +360,16 @@ class RaspberryPi:
 
         self.GPIO_RST_PIN.off()
         self.GPIO_DC_PIN.off()
-        self.GPIO_PWR_PIN.off()
+        if self.GPIO_PWR_PIN is not None:
+            self.GPIO_PWR_PIN.off()
         logger.debug("close 5V, Module enters 0 power consumption ...")
         
         if cleanup:
             self.GPIO_RST_PIN.close()
             self.GPIO_DC_PIN.close()
             # self.GPIO_CS_PIN.close()
-            self.GPIO_PWR_PIN.close()
+            if self.GPIO_PWR_PIN is not None:
+                self.GPIO_PWR_PIN.close()
             self.GPIO_BUSY_PIN.close()
 
         
@@ -172,9 +383,15 @@ class JetsonNano:
     CS_PIN   = 8
     BUSY_PIN = 24
     PWR_PIN  = 18
+    # The software SPI library drives fixed MOSI/SCLK pins, SPI_BUS and
+    # SPI_DEVICE are only kept for a common configuration
+    SPI_BUS  = 0
+    SPI_DEVICE = 0
+    SPI_HZ   = None
 
-    def __init__(self):
+    def __init__(self, **options):
         import ctypes
+        _configure(self, options)
         find_dirs = [
             os.path.dirname(os.path.realpath(__file__)),
             '/usr/local/lib',
@@ -188,6 +405,7 @@ class JetsonNano:
                 break
         if self.SPI is None:
             raise RuntimeError('Cannot find sysfs_software_spi.so')
+        self._spi_transfer, self._spi_writebytes = _bind_software_spi(self.SPI)
 
         import Jetson.GPIO
         self.GPIO = Jetson.GPIO
@@ -198,26 +416,41 @@ class JetsonNano:
     def digital_read(self, pin):
         return self.GPIO.input(self.BUSY_PIN)
 
+    def wait_for_pin(self, pin, level, timeout_ms=None):
+        return _wait_for_edge(self, pin, level, timeout_ms)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
     def spi_writebyte(self, data):
-        self.SPI.SYSFS_software_spi_transfer(data[0])
+        self._spi_transfer(data[0])
 
     def spi_writebyte2(self, data):
-        for i in range(len(data)):
-            self.SPI.SYSFS_software_spi_transfer(data[i])
+        view = _byte_view(data)
+        if self._spi_writebytes is None:
+            # Older library: still one ctypes call per byte, but without
+            # the Python-level indexing and attribute lookups
+            collections.deque(map(self._spi_transfer, view), maxlen=0)
+        elif len(view):
+            if view.readonly:
+                buf = (c_uint8 * len(view)).from_buffer_copy(view)
+            else:
+                buf = (c_uint8 * len(view)).from_buffer(view)
+            self._spi_writebytes(buf, len(view))
+
+    def spi_writefill(self, value, count):
+        _write_fill(self.spi_writebyte2, value, count, FILL_CHUNK)
 
-    def module_init(self):
+    def module_init(self, module_name=None):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
         self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
         self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
         self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
         self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
-        
-        self.GPIO.output(self.PWR_PIN, 1)
+        if self.PWR_PIN is not None:
+            self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
+            self.GPIO.output(self.PWR_PIN, 1)
         
         self.SPI.SYSFS_software_spi_begin()
         return 0
@@ -229,9 +462,11 @@ class JetsonNano:
         logger.debug("close 5V, Module enters 0 power consumption ...")
         self.GPIO.output(self.RST_PIN, 0)
         self.GPIO.output(self.DC_PIN, 0)
-        self.GPIO.output(self.PWR_PIN, 0)
+        if self.PWR_PIN is not None:
+            self.GPIO.output(self.PWR_PIN, 0)
 
-        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
+        self.GPIO.cleanup([pin for pin in (self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN)
+                           if pin is not None])
 
 
 class SunriseX3:
@@ -241,12 +476,17 @@ class SunriseX3:
     CS_PIN   = 8
     BUSY_PIN = 24
     PWR_PIN  = 18
+    SPI_BUS  = 2
+    SPI_DEVICE = 0
+    SPI_HZ   = None
     Flag     = 0
 
-    def __init__(self):
+    def __init__(self, **options):
         import spidev
         import Hobot.GPIO
 
+        _configure(self, options)
+
         self.GPIO = Hobot.GPIO
         self.SPI = spidev.SpiDev()
 
@@ -256,6 +496,9 @@ class SunriseX3:
     def digital_read(self, pin):
         return self.GPIO.input(pin)
 
+    def wait_for_pin(self, pin, level, timeout_ms=None):
+        return _wait_for_edge(self, pin, level, timeout_ms)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -267,7 +510,10 @@ class SunriseX3:
         #     self.SPI.writebytes([data[i]])
         self.SPI.xfer3(data)
 
-    def module_init(self):
+    def spi_writefill(self, value, count):
+        _write_fill(self.SPI.xfer3, value, count, FILL_CHUNK)
+
+    def module_init(self, module_name=None):
         if self.Flag == 0:
             self.Flag = 1
             self.GPIO.setmode(self.GPIO.BCM)
@@ -275,14 +521,14 @@ class SunriseX3:
             self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
             self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
             self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
-            self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
             self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
-
-            self.GPIO.output(self.PWR_PIN, 1)
+            if self.PWR_PIN is not None:
+                self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
+                self.GPIO.output(self.PWR_PIN, 1)
         
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
+            # SPI device, bus = 2, device = 0 unless configured
+            self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+            self.SPI.max_speed_hz = spi_speed(module_name, self)
             self.SPI.mode = 0b00
             return 0
         else:
@@ -296,27 +542,437 @@ class SunriseX3:
         self.Flag = 0
         self.GPIO.output(self.RST_PIN, 0)
         self.GPIO.output(self.DC_PIN, 0)
-        self.GPIO.output(self.PWR_PIN, 0)
+        if self.PWR_PIN is not None:
+            self.GPIO.output(self.PWR_PIN, 0)
+
+        self.GPIO.cleanup([pin for pin in (self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN)
+                           if pin is not None])
+
+
+class _VirtualSPI:
+    # Stand-in for spidev.SpiDev, for drivers that write to epdconfig.SPI directly
+    def __init__(self, owner):
+        self.owner = owner
+        self.max_speed_hz = DEFAULT_SPI_HZ
+        self.mode = 0b00
+
+    def writebytes(self, data):
+        self.owner.spi_writebyte(data)
+
+    def writebytes2(self, data):
+        self.owner.spi_writebyte2(data)
+
+    def xfer3(self, data):
+        self.owner.spi_writebyte2(data)
+        return [0x00] * len(data)
+
+    def close(self):
+        pass
+
+
+# Hardware-free backend, selected with EPD_BACKEND=virtual. It records every
+# command and data byte, keeps the controller RAM and simulates BUSY:
+#   EPD_VIRTUAL_PANEL       driver module to emulate, default: the module_name the driver
+#                           passes to module_init
+#   EPD_VIRTUAL_REFRESH_MS  refresh duration for every panel, overrides the table below
+#   EPD_VIRTUAL_TIME_SCALE  1 sleeps through panel waits, 0 only simulates them
+#   EPD_VIRTUAL_OUTPUT      directory that receives a PNG of the RAM at every refresh
+#   EPD_VIRTUAL_MAX_SPI_HZ  fastest clock the emulated panel reads cleanly, data
+#                           sent faster arrives with bit errors
+class Virtual:
+    # Pin definition, same numbering as the Raspberry Pi HAT
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+    SPI_BUS  = 0
+    SPI_DEVICE = 0
+    SPI_HZ   = None
+
+    # Drivers whose BUSY line is high while the controller works (SSD16xx
+    # family); every other panel pulls it low (UC81xx family)
+    BUSY_HIGH_PANELS = (
+        'epd13in3b', 'epd13in3k', 'epd1in54', 'epd1in54_V2', 'epd1in54b_V2',
+        'epd2in13', 'epd2in13_V2', 'epd2in13_V3', 'epd2in13_V4', 'epd2in13b_V4',
+        'epd2in15b', 'epd2in66', 'epd2in66b', 'epd2in7_V2', 'epd2in7b_V2',
+        'epd2in9', 'epd2in9_V2', 'epd2in9b_V4', 'epd3in7', 'epd4in26',
+        'epd4in2_V2', 'epd5in79', 'epd5in79b', 'epd7in5_HD', 'epd7in5b_HD',
+    )
+
+    # Typical full refresh time in ms. Panels not listed in REFRESH_MS
+    # fall back to the duration of their color family
+    REFRESH_MS = {
+        'epd7in3e': 19000,
+    }
+    FAMILY_REFRESH_MS = (
+        ('f', 30000),   # 7-color ACeP
+        ('g', 20000),   # 4-color black/white/yellow/red
+        ('b', 15000),   # black/white/red
+        ('bc', 15000),
+        ('c', 15000),
+    )
+    MONO_REFRESH_MS = 3000
+    POWER_MS = 100
+    RESET_MS = 10
+
+    def __init__(self, **options):
+        _configure(self, options)
+        # Driver module name such as 'epd2in66g', taken from the module_name
+        # the driver passes to module_init unless pinned through the environment
+        self.panel_override = os.environ.get('EPD_VIRTUAL_PANEL')
+        self.panel = None
+        self.refresh_ms = os.environ.get('EPD_VIRTUAL_REFRESH_MS')
+        # 1.0 sleeps for real, 0 only advances the simulated clock
+        self.time_scale = float(os.environ.get('EPD_VIRTUAL_TIME_SCALE', '1'))
+        self.output_dir = os.environ.get('EPD_VIRTUAL_OUTPUT')
+        self.max_spi_hz = os.environ.get('EPD_VIRTUAL_MAX_SPI_HZ')
+        self.SPI = _VirtualSPI(self)
+        self.spi_bufsiz = 4096
+        self.width = None
+        self.height = None
+        self.busy_level = 0
+        self.reset_stats()
+        self._dc = 0
+        self._rst = 1
+        self._skipped = 0.0
+        self._busy_until = 0.0
+        self._busy_pending = False
+        self.ram = {}            # RAM write command -> last full-frame payload
+
+    def reset_stats(self):
+        self.log = []            # (command, bytearray of data) in send order
+        self.transactions = 0
+        self.data_bytes = 0
+        self.refreshes = 0
+        self.wait_time = 0.0     # seconds spent in delay_ms, i.e. panel wait
+        self.bus_time = 0.0      # seconds the data took at the SPI clock
+
+    def _now(self):
+        return time.perf_counter() + self._skipped
+
+    def clock(self):
+        """Seconds on the emulated panel's clock, which keeps running through
+        the waits the time scale skips."""
+        return self._now()
+
+    def set_busy(self, duration_ms):
+        self._busy_until = self._now() + duration_ms / 1000.0
+        # A zero-length busy phase must still be visible to one read,
+        # otherwise drivers that wait for BUSY to assert would hang
+        self._busy_pending = True
+
+    @classmethod
+    def typical_refresh_ms(cls, panel):
+        # Full refresh time of a driver module such as 'epd2in66g'
+        if panel in cls.REFRESH_MS:
+            return cls.REFRESH_MS[panel]
+        suffix = re.sub(r'^epd\d+in\d*', '', (panel or '').split('_')[0])
+        for family, ms in cls.FAMILY_REFRESH_MS:
+            if suffix == family:
+                return ms
+        return cls.MONO_REFRESH_MS
+
+    def _panel_refresh_ms(self):
+        if self.refresh_ms is not None:
+            return float(self.refresh_ms)
+        return self.typical_refresh_ms(self.panel)
+
+    def _attach(self, module_name):
+        # Pick up the geometry and BUSY polarity of the driver in use
+        panel = self.panel_override
+        if panel is None and module_name.startswith(__package__ + '.epd'):
+            panel = module_name.rsplit('.', 1)[1]
+        if panel != self.panel:
+            self.panel = panel
+            self.ram = {}
+        module = sys.modules.get(__package__ + '.' + str(self.panel))
+        if module is not None:
+            self.width = getattr(module, 'EPD_WIDTH', None)
+            self.height = getattr(module, 'EPD_HEIGHT', None)
+        self.busy_level = 1 if self.panel in self.BUSY_HIGH_PANELS else 0
+
+    def _store_ram(self):
+        # Keep the last full-frame payload of every RAM write command, the
+        # way the controller RAM keeps its content between refreshes
+        if self.log and self.width and self.height:
+            command, data = self.log[-1]
+            if len(data) >= self.height and len(data) % self.height == 0:
+                self.ram[command] = bytes(data)
+
+    def _on_command(self, command):
+        self._store_ram()
+        self.log.append((command, bytearray()))
+        if self.busy_level:
+            if command == 0x20:      # MASTER_ACTIVATION
+                self._refresh()
+            elif command == 0x12:    # SW_RESET
+                self.set_busy(self.RESET_MS)
+        else:
+            if command in (0x12, 0x17):  # DISPLAY_REFRESH, AUTO_SEQUENCE (epd3in52)
+                self._refresh()
+            elif command in (0x02, 0x04):  # POWER_OFF, POWER_ON
+                self.set_busy(self.POWER_MS)
+
+    def _wire(self, data):
+        # Above max_spi_hz flip the low bit of every stride-th byte; the
+        # error rate grows with the overclock
+        if self.max_spi_hz is None or self.SPI.max_speed_hz <= float(self.max_spi_hz):
+            return data
+        limit = float(self.max_spi_hz)
+        stride = max(1, int(64 * limit / (self.SPI.max_speed_hz - limit)))
+        data = bytearray(data)
+        for i in range(-self.data_bytes % stride, len(data), stride):
+            data[i] ^= 0x01
+        return data
+
+    def read_ram(self):
+        """Copy of the emulated controller RAM, RAM write command -> bytes."""
+        self._store_ram()
+        return dict(self.ram)
+
+    def _on_data(self, data):
+        data = self._wire(data)
+        if not self.log:
+            self.log.append((None, bytearray()))
+        self.log[-1][1].extend(data)
+        self.data_bytes += len(data)
+
+    def _refresh(self):
+        self.refreshes += 1
+        self.set_busy(self._panel_refresh_ms())
+        if self.output_dir:
+            self.save_png(os.path.join(self.output_dir, '%s_%04d.png' % (self.panel, self.refreshes)))
+
+    def save_png(self, path):
+        """Decode the controller RAM into a PNG, one horizontal band per RAM plane."""
+        import numpy as np
+        from PIL import Image
+
+        bands = []
+        self._store_ram()
+        for command, data in sorted(self.ram.items()):
+            row_bytes = len(data) // self.height
+            bpp = max([b for b in (1, 2, 4) if (self.width * b + 7) // 8 <= row_bytes] or [1])
+            rows = np.frombuffer(data, dtype=np.uint8).reshape(self.height, row_bytes)
+            bits = np.unpackbits(rows, axis=1)
+            if bpp > 1:
+                weights = 1 << np.arange(bpp - 1, -1, -1)
+                bits = (bits.reshape(self.height, -1, bpp) * weights).sum(axis=2)
+            pixels = bits[:, :self.width].astype(np.uint8)
+            if bpp == 1:
+                band = Image.fromarray(pixels * 255, 'L')
+            else:
+                band = Image.fromarray(pixels, 'P')
+                if bpp == 2:
+                    band.putpalette((0,0,0,  255,255,255,  255,255,0,  255,0,0))
+                else:
+                    band.putpalette((0,0,0,  255,255,255,  0,255,0,  0,0,255,  255,0,0,  255,255,0,  255,128,0,  128,128,128))
+            bands.append(band.convert('RGB'))
+        if not bands:
+            logger.debug("virtual: no full-frame RAM write to save")
+            return None
+        sheet = Image.new('RGB', (self.width, self.height * len(bands)), (128, 128, 128))
+        for i, band in enumerate(bands):
+            sheet.paste(band, (0, i * self.height))
+        sheet.save(path)
+        return path
+
+    def digital_write(self, pin, value):
+        if pin == self.DC_PIN:
+            self._dc = value
+        elif pin == self.RST_PIN:
+            if value and not self._rst:
+                self.set_busy(self.RESET_MS)
+            self._rst = value
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            if self._busy_pending or self._now() < self._busy_until:
+                self._busy_pending = False
+                return self.busy_level
+            return 1 - self.busy_level
+        elif pin == self.RST_PIN:
+            return self._rst
+        elif pin == self.DC_PIN:
+            return self._dc
+        return 0
+
+    def wait_for_pin(self, pin, level, timeout_ms=None):
+        if self.digital_read(pin) == level:
+            return True
+        if pin != self.BUSY_PIN or level == self.busy_level:
+            # Nothing in the model would ever drive this transition
+            logger.warning("virtual: pin %d never reaches %d", pin, level)
+            if timeout_ms is not None:
+                self.delay_ms(timeout_ms)
+            return False
+        remaining_ms = max(0.0, (self._busy_until - self._now()) * 1000.0)
+        if timeout_ms is not None and timeout_ms < remaining_ms:
+            self.delay_ms(timeout_ms)
+            return False
+        self.delay_ms(remaining_ms)
+        return True
+
+    def _elapse(self, seconds):
+        if self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+        self._skipped += seconds * (1 - self.time_scale)
+
+    def _clock_out(self, nbytes):
+        # Time the bytes spend on the wire at the configured SPI clock
+        seconds = nbytes * 8.0 / self.SPI.max_speed_hz
+        self.bus_time += seconds
+        self._elapse(seconds)
 
-        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
+    def delay_ms(self, delaytime):
+        seconds = delaytime / 1000.0
+        self.wait_time += seconds
+        self._elapse(seconds)
+
+    def spi_writebyte(self, data):
+        self.transactions += 1
+        self._clock_out(len(data))
+        if self._dc:
+            self._on_data(_low_bytes(data))
+        else:
+            for command in data:
+                self._on_command(command)
+
+    def spi_writebyte2(self, data):
+        # Same chunking as the Raspberry Pi transport
+        view = _byte_view(data)
+        for start in range(0, len(view), self.spi_bufsiz):
+            chunk = view[start:start + self.spi_bufsiz]
+            self.transactions += 1
+            self._clock_out(len(chunk))
+            self._on_data(chunk)
+
+    def spi_writefill(self, value, count):
+        _write_fill(self.spi_writebyte2, value, count, self.spi_bufsiz)
 
+    def DEV_SPI_write(self, data):
+        self.spi_writebyte([data])
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
+    def DEV_SPI_nwrite(self, data):
+        self.spi_writebyte2(data)
 
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
+    def DEV_SPI_read(self):
+        return 0x00
 
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+    def module_init(self, cleanup=False, module_name=None):
+        self._attach(module_name or '')
+        self.SPI.max_speed_hz = spi_speed(module_name, self)
+        return 0
+
+    def module_exit(self, cleanup=False):
+        logger.debug("virtual: %d transactions, %d data bytes, %d refreshes",
+                     self.transactions, self.data_bytes, self.refreshes)
+
+
+# Pin numbers are the same for every backend, so drivers can read them
+# without a backend being built
+RST_PIN  = 17
+DC_PIN   = 25
+CS_PIN   = 8
+BUSY_PIN = 24
+PWR_PIN  = 18
+
+_BACKENDS = {
+    'raspberrypi': RaspberryPi,
+    'sunrisex3':   SunriseX3,
+    'jetsonnano':  JetsonNano,
+    'virtual':     Virtual,
+}
+
+_platform = None
+_build_lock = threading.Lock()
+_wait_hooks = threading.local()
+
+
+def set_wait_hook(hook):
+    """Route the wait_for_pin calls made on the current thread through hook.
+
+    hook(wait, pin, level, timeout_ms) gets the backend's wait_for_pin as
+    wait and returns what it would. None removes the hook again.
+    """
+    _wait_hooks.hook = hook
+
+
+def _hooked_wait(wait):
+    def wait_for_pin(pin, level, timeout_ms=None):
+        hook = getattr(_wait_hooks, 'hook', None)
+        if hook is None:
+            return wait(pin, level, timeout_ms)
+        return hook(wait, pin, level, timeout_ms)
+    return wait_for_pin
+
+
+def _read_text(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8', 'replace').replace('\x00', '')
+    except (IOError, OSError):
+        return ''
+
+
+def detect_platform():
+    """Name of the backend for this machine, one of the _BACKENDS keys.
+
+    EPD_BACKEND overrides the detection. The result is cached, later
+    calls cost nothing.
+    """
+    global _platform
+    if _platform is None:
+        forced = os.environ.get('EPD_BACKEND', '').lower()
+        if forced in _BACKENDS:
+            _platform = forced
+        elif ('Raspberry' in _read_text('/proc/device-tree/model')
+                or 'Raspberry' in _read_text('/proc/cpuinfo')):
+            _platform = 'raspberrypi'
+        elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+            _platform = 'sunrisex3'
+        else:
+            _platform = 'jetsonnano'
+        logger.debug("epdconfig platform: %s", _platform)
+    return _platform
+
+
+def create(**options):
+    """A new backend for this machine with pins and SPI device of its own.
+
+    Pass it to a driver to run several panels from one process, e.g.
+    epd2in66g.EPD(epdconfig.create(rst_pin=5, dc_pin=6, busy_pin=13,
+    pwr_pin=None, spi_device=1)). Options: rst_pin, dc_pin, cs_pin,
+    busy_pin, pwr_pin (None for a panel without a power switch of its
+    own), spi_bus, spi_device and spi_hz (the SPI clock of this panel
+    alone); the rest keep the HAT defaults.
+    """
+    return _BACKENDS[detect_platform()](**options)
+
+
+def _build():
+    # The backend claims SPI and GPIO, so build it on first hardware use
+    # rather than at import time
+    with _build_lock:
+        module = sys.modules[__name__]
+        if 'implementation' not in module.__dict__:
+            implementation = _BACKENDS[detect_platform()]()
+            for func in [x for x in dir(implementation) if not x.startswith('_')]:
+                setattr(module, func, getattr(implementation, func))
+            module.implementation = implementation
+        return module.implementation
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    implementation = _build()
+    if name == 'implementation':
+        return implementation
+    try:
+        return getattr(implementation, name)
+    except AttributeError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 ### END OF FILE ###
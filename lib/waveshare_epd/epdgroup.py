@@ -0,0 +1,100 @@
+# *****************************************************************************
+# * | File        :	  epdgroup.py
+# * | Function    :   Drive several panels from one process
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   upload to the panels one after another and let their
+# * |                 refreshes run at the same time
+# ******************************************************************************/
+
+import logging
+import threading
+from . import epdconfig
+
+logger = logging.getLogger(__name__)
+
+
+class PanelGroup:
+    """Refresh several panels together, overlapping their BUSY phases.
+
+    targets are DisplaySession (or RefreshScheduler) objects, each around
+    a driver built with its own backend from epdconfig.create(). Every
+    panel runs on a thread of its own, but only one at a time holds the
+    bus: a panel lets go of it while it waits for BUSY and takes it back
+    afterwards. Command and frame uploads so go out one after another,
+    while the slow refreshes overlap, and N panels take about one
+    refresh plus N uploads instead of N refreshes.
+
+    Sessions must be built with idle_timeout=None: their idle timer
+    would put a panel to sleep from a thread that does not hold the bus,
+    in the middle of another panel's upload. Call sleep() on the group
+    instead.
+    """
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+        for index, target in enumerate(self.targets):
+            if getattr(target, 'idle_timeout', None) is not None:
+                raise ValueError("panel %d has an idle timeout, build its session with idle_timeout=None" % index)
+        self._bus = threading.Lock()
+
+    def show(self, images):
+        """Display one PIL image per target, None leaves a panel as it is.
+        Returns the targets' results in the same order."""
+        return self._each('show', images)
+
+    def show_frame(self, frames):
+        """Like show with frames from each target's getbuffer."""
+        return self._each('show_frame', frames)
+
+    def clear(self):
+        return self._each('clear', [()] * len(self.targets), unpack=True)
+
+    def sleep(self):
+        return self._each('sleep', [()] * len(self.targets), unpack=True)
+
+    def _each(self, name, items, unpack=False):
+        items = list(items)
+        if len(items) != len(self.targets):
+            raise ValueError("%d items for %d panels" % (len(items), len(self.targets)))
+        results = [None] * len(items)
+        errors = [None] * len(items)
+        threads = []
+        for index, (target, item) in enumerate(zip(self.targets, items)):
+            if item is None:
+                continue
+            args = item if unpack else (item,)
+            thread = threading.Thread(target=self._run, args=(getattr(target, name), args, index, results, errors),
+                                      name='epd-panel-%d' % index, daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        for index, error in enumerate(errors):
+            if error is not None:
+                logger.error("group: panel %d failed: %s", index, error)
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
+
+    def _run(self, call, args, index, results, errors):
+        epdconfig.set_wait_hook(self._wait)
+        try:
+            with self._bus:
+                results[index] = call(*args)
+        except Exception as e:
+            errors[index] = e
+        finally:
+            epdconfig.set_wait_hook(None)
+
+    def _wait(self, wait, pin, level, timeout_ms):
+        # Hand the bus to the next panel while this one is busy
+        self._bus.release()
+        try:
+            return wait(pin, level, timeout_ms)
+        finally:
+            self._bus.acquire()
+
+### END OF FILE ###
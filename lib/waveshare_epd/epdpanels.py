@@ -0,0 +1,185 @@
+# *****************************************************************************
+# * | File        :	  epdpanels.py
+# * | Function    :   Descriptor table of the supported panels
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   what each panel is, without importing its driver:
+# * |                 get_panel("2in66g").open() loads it when needed
+# ******************************************************************************/
+
+import importlib
+from collections import namedtuple
+
+# Pixel formats of a FrameBuffer
+FORMAT_1BPP = '1bpp'
+FORMAT_2BPP = '2bpp'
+FORMAT_4BPP = '4bpp'
+# Two 1bpp planes back to back, e.g. black and red of a tri-color panel
+FORMAT_DUAL = 'dual-plane'
+
+# Panel colors in index order (R, G, B), per panel family
+PALETTE_MONO = ((0,0,0), (255,255,255))
+PALETTE_RED = ((0,0,0), (255,255,255), (255,0,0))
+PALETTE_YELLOW = ((0,0,0), (255,255,255), (255,255,0))
+PALETTE_4COLOR = ((0,0,0), (255,255,255), (255,255,0), (255,0,0))
+PALETTE_6COLOR = ((0,0,0), (255,255,255), (255,255,0), (255,0,0), (0,0,255), (0,255,0))
+PALETTE_7COLOR = ((0,0,0), (255,255,255), (0,255,0), (0,0,255), (255,0,0), (255,255,0), (255,128,0))
+
+# Refresh modes, see epdscheduler
+FULL = 'full'
+FAST = 'fast'
+PARTIAL = 'partial'
+GRAY4 = '4gray'
+
+# Typical refresh time of the cheaper modes as a share of the full one
+FAST_SHARE = 0.5
+PARTIAL_SHARE = 0.15
+_SHARES = {FAST: FAST_SHARE, PARTIAL: PARTIAL_SHARE}
+# Full refresh of a panel without a table entry
+MONO_REFRESH_MS = 3000
+
+_1 = FORMAT_1BPP
+_2 = FORMAT_2BPP
+_4 = FORMAT_4BPP
+_D = FORMAT_DUAL
+
+# name, width, height, format, palette, SPI clock in Hz (the driver's
+# EPD_SPI_HZ), full refresh in ms, refresh modes besides full that
+# epdscheduler drives. tests/test_epdpanels.py checks the last three
+# against the drivers, epdscheduler and the virtual backend
+_PANELS = (
+    ('13in3b',       960, 680, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('13in3k',       960, 680, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, GRAY4)),
+    ('1in02',         80, 128, _1, PALETTE_MONO,     8000000,  3000, ()),
+    ('1in54',        200, 200, _1, PALETTE_MONO,    10000000,  3000, ()),
+    ('1in54_V2',     200, 200, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL,)),
+    ('1in54b',       200, 200, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('1in54b_V2',    200, 200, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('1in54c',       152, 152, _D, PALETTE_YELLOW,   8000000, 15000, ()),
+    ('1in64g',       168, 168, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('2in13',        122, 250, _1, PALETTE_MONO,    10000000,  3000, ()),
+    ('2in13_V2',     122, 250, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL,)),
+    ('2in13_V3',     122, 250, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL,)),
+    ('2in13_V4',     122, 250, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST)),
+    ('2in13b_V3',    104, 212, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('2in13b_V4',    122, 250, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('2in13bc',      104, 212, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('2in13d',       104, 212, _1, PALETTE_MONO,     8000000,  3000, ()),
+    ('2in13g',       122, 250, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('2in15b',       160, 296, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('2in15g',       160, 296, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('2in36g',       168, 296, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('2in66',        152, 296, _1, PALETTE_MONO,    10000000,  3000, ()),
+    ('2in66b',       152, 296, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('2in66g',       184, 360, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('2in7',         176, 264, _1, PALETTE_MONO,     8000000,  3000, (GRAY4,)),
+    ('2in7_V2',      176, 264, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('2in7b',        176, 264, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('2in7b_V2',     176, 264, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('2in9',         128, 296, _1, PALETTE_MONO,    10000000,  3000, ()),
+    ('2in9_V2',      128, 296, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('2in9b_V3',     128, 296, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('2in9b_V4',     128, 296, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('2in9bc',       128, 296, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('2in9d',        128, 296, _1, PALETTE_MONO,     8000000,  3000, ()),
+    ('3in0g',        168, 400, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('3in52',        240, 360, _1, PALETTE_MONO,     8000000,  3000, ()),
+    ('3in7',         280, 480, _1, PALETTE_MONO,    10000000,  3000, (GRAY4,)),
+    ('4in01f',       640, 400, _4, PALETTE_7COLOR,   8000000, 30000, ()),
+    ('4in2',         400, 300, _1, PALETTE_MONO,     8000000,  3000, (GRAY4,)),
+    ('4in26',        800, 480, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('4in2_V2',      400, 300, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('4in2b_V2',     400, 300, _D, PALETTE_RED,      4000000, 15000, ()),
+    ('4in2b_V2_old', 400, 300, _D, PALETTE_RED,      4000000, 15000, ()),
+    ('4in2bc',       400, 300, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('4in37g',       512, 368, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('5in65f',       600, 448, _4, PALETTE_7COLOR,   8000000, 30000, ()),
+    ('5in79',        792, 272, _1, PALETTE_MONO,    10000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('5in79b',       792, 272, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('5in79g',       792, 272, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('5in83',        600, 448, _2, PALETTE_MONO,     8000000,  3000, ()),
+    ('5in83_V2',     648, 480, _1, PALETTE_MONO,     8000000,  3000, ()),
+    ('5in83b_V2',    648, 480, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('5in83bc',      600, 448, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('7in3e',        800, 480, _4, PALETTE_6COLOR,   8000000, 19000, ()),
+    ('7in3f',        800, 480, _4, PALETTE_7COLOR,   8000000, 30000, ()),
+    ('7in3g',        800, 480, _2, PALETTE_4COLOR,   8000000, 20000, ()),
+    ('7in5',         640, 384, _4, PALETTE_MONO,     8000000,  3000, ()),
+    ('7in5_HD',      880, 528, _1, PALETTE_MONO,    10000000,  3000, ()),
+    ('7in5_V2',      800, 480, _1, PALETTE_MONO,     8000000,  3000, (PARTIAL, FAST, GRAY4)),
+    ('7in5_V2_old',  800, 480, _1, PALETTE_MONO,     8000000,  3000, (PARTIAL, FAST)),
+    ('7in5b_HD',     880, 528, _D, PALETTE_RED,     10000000, 15000, ()),
+    ('7in5b_V2',     800, 480, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('7in5b_V2_old', 800, 480, _D, PALETTE_RED,      8000000, 15000, ()),
+    ('7in5bc',       640, 384, _D, PALETTE_RED,      8000000, 15000, ()),
+)
+
+
+class Panel(namedtuple('Panel', 'name width height format palette spi_hz refresh_ms')):
+    """Descriptor of one panel. refresh_ms maps every refresh mode
+    epdscheduler drives on the panel to its typical duration, so
+    `mode in refresh_ms` tells what the panel can do. Only driver() and
+    open() import the driver."""
+
+    __slots__ = ()
+
+    @property
+    def module_name(self):
+        return __package__ + '.epd' + self.name
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    @property
+    def colors(self):
+        return len(self.palette)
+
+    @property
+    def modes(self):
+        return tuple(self.refresh_ms)
+
+    def driver(self):
+        """The driver module, imported on first use."""
+        return importlib.import_module(self.module_name)
+
+    def open(self, config=None):
+        """A driver instance for this panel, on the backend config
+        (epdconfig.create()) or the shared one."""
+        return self.driver().EPD(config)
+
+
+def _panel(name, width, height, format, palette, spi_hz, full_ms, modes):
+    refresh_ms = {FULL: full_ms}
+    for mode in modes:
+        refresh_ms[mode] = full_ms * _SHARES.get(mode, 1.0)
+    return Panel(name, width, height, format, palette, spi_hz, refresh_ms)
+
+
+PANELS = {row[0]: _panel(*row) for row in _PANELS}
+
+
+def get_panel(name):
+    """The Panel descriptor for a name such as '2in66g' or 'epd2in66g'."""
+    key = name[3:] if name.startswith('epd') else name
+    try:
+        return PANELS[key]
+    except KeyError:
+        raise KeyError("unknown panel %r" % name) from None
+
+
+def panels():
+    """Every Panel descriptor, ordered by name."""
+    return [PANELS[name] for name in sorted(PANELS)]
+
+
+def typical_refresh_ms(module_name, mode=FULL):
+    """Typical time in ms a refresh in mode keeps the panel of the driver
+    module module_name, such as 'epd2in66g', busy. Drivers outside the
+    table count as a monochrome panel."""
+    panel = PANELS.get(module_name[3:] if module_name.startswith('epd') else module_name)
+    full = panel.refresh_ms[FULL] if panel is not None else MONO_REFRESH_MS
+    return full * _SHARES.get(mode, 1.0)
+
+### END OF FILE ###
@@ -0,0 +1,156 @@
+# *****************************************************************************
+# * | File        :	  epdpartial.py
+# * | Function    :   Dirty-rectangle partial refresh for the panel drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   keep the last frame, diff the next one against it and
+# * |                 send only the changed windows through the partial path
+# ******************************************************************************/
+
+import logging
+from collections import namedtuple
+from . import epdbuffer
+
+logger = logging.getLogger(__name__)
+
+# How a driver's partial method takes the update
+WHOLE_FRAME = 'frame'           # method(frame), the controller diffs its RAM itself
+WINDOW_IN_FRAME = 'window'      # method(frame, x0, y0, x1, y1), sends the window out of the frame
+WINDOW_DATA = 'window-data'     # method(window bytes, x0, y0, x1, y1)
+
+# method/base are driver method names, base writing a full frame that
+# later partials are diffed against. full_init/partial_init are
+# (method name, args); partial_init None when the partial method sets
+# the controller up itself.
+PartialPath = namedtuple('PartialPath', 'method convention base full_init partial_init')
+
+_INIT = ('init', ())
+
+# epd4in2 is left out: EPD_4IN2_PartialDisplay indexes the frame with
+# X_start / 8, a float, and fails on Python 3. So is epd13in3b: its
+# display_Partial only rewrites the black RAM, while display_Base takes
+# both color planes, so a 1bpp frame cannot serve as its base without
+# leaving stale data in the red RAM. Call its display_Partial directly.
+PARTIAL_PATHS = {
+    'epd1in54_V2': PartialPath('displayPart', WHOLE_FRAME, 'displayPartBaseImage', ('init', (0,)), ('init', (1,))),
+    'epd2in13_V2': PartialPath('displayPartial', WHOLE_FRAME, 'displayPartBaseImage', ('init', (0,)), ('init', (1,))),
+    'epd2in13_V3': PartialPath('displayPartial', WHOLE_FRAME, 'displayPartBaseImage', _INIT, None),
+    'epd2in13_V4': PartialPath('displayPartial', WHOLE_FRAME, 'displayPartBaseImage', _INIT, None),
+    'epd2in9_V2': PartialPath('display_Partial', WHOLE_FRAME, 'display_Base', _INIT, None),
+    'epd4in2_V2': PartialPath('display_Partial', WHOLE_FRAME, 'display', _INIT, None),
+    'epd4in26': PartialPath('display_Partial', WHOLE_FRAME, 'display_Base', _INIT, None),
+    'epd5in79': PartialPath('display_Partial', WHOLE_FRAME, 'display_Base', _INIT, ('init_Partial', ())),
+    'epd2in7_V2': PartialPath('display_Partial', WINDOW_IN_FRAME, 'display_Base', _INIT, None),
+    'epd13in3k': PartialPath('display_Partial', WINDOW_IN_FRAME, 'display_Base', _INIT, ('init_Part', ())),
+    'epd7in5_V2': PartialPath('display_Partial', WINDOW_DATA, 'display', _INIT, ('init_part', ())),
+    'epd7in5_V2_old': PartialPath('display_Partial', WINDOW_DATA, 'display', _INIT, ('init_part', ())),
+}
+
+
+def partial_path(epd):
+    """The PartialPath of a driver instance, or None when it has none."""
+    return PARTIAL_PATHS.get(type(epd).__module__.rsplit('.', 1)[-1])
+
+
+def send_windows(epd, path, frame, boxes):
+    """Refresh the boxes of frame through the partial method of path.
+
+    The controller must be in partial mode already. A whole-frame
+    partial method is called once whatever the boxes.
+    """
+    method = getattr(epd, path.method)
+    if path.convention == WHOLE_FRAME:
+        method(frame)
+        return
+    for box in boxes:
+        logger.debug("partial: window %s", box)
+        if path.convention == WINDOW_IN_FRAME:
+            method(frame, *box)
+        else:
+            method(epdbuffer.crop(frame, (epd.width + 7) // 8, epd.height, box), *box)
+
+
+class PartialRefresher:
+    """Update a 1bpp panel through its partial refresh path where it pays.
+
+    epd is a driver instance listed in PARTIAL_PATHS, or any driver when
+    path is given. Every frame is diffed against the last one shown
+    (epdbuffer.dirty_rects). Frames that change nothing are skipped; the
+    first frame, and any whose changed boxes cover more than
+    full_fraction of the panel, get a full refresh through the base
+    method so the controller holds a fresh reference; the rest only send
+    the changed windows. More than max_windows boxes are merged into
+    their bounding box, as every window is a refresh of its own.
+
+    The controller is inited for full or partial mode only when the mode
+    changes.
+    """
+
+    def __init__(self, epd, full_fraction=0.5, max_windows=4, row_gap=16, path=None):
+        self.epd = epd
+        self.path = path or partial_path(epd)
+        if self.path is None:
+            raise ValueError("%s has no partial refresh path" % type(epd).__module__)
+        self.full_fraction = full_fraction
+        self.max_windows = max_windows
+        self.row_gap = row_gap
+        self.row_bytes = (epd.width + 7) // 8
+        self.last_frame = None
+        self.mode = None
+        self.full_refreshes = 0
+        self.partial_refreshes = 0
+
+    def show(self, image):
+        """Display a PIL image. Returns 'full', 'partial' or None when nothing changed."""
+        return self.show_frame(self.epd.getbuffer(image))
+
+    def show_frame(self, frame):
+        """Display a buffer from getbuffer. Returns 'full', 'partial' or
+        None when it was already on the panel."""
+        data = bytes(frame)
+        if self.last_frame is None:
+            return self.refresh_full(frame)
+        boxes = epdbuffer.dirty_rects(self.last_frame, data, self.row_bytes, self.epd.height, self.row_gap)
+        if not boxes:
+            logger.debug("partial: frame unchanged, refresh skipped")
+            return None
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+        if area > self.full_fraction * self.row_bytes * 8 * self.epd.height:
+            logger.debug("partial: %d pixels changed, full refresh", area)
+            return self.refresh_full(frame)
+        if len(boxes) > self.max_windows:
+            boxes = [(min(b[0] for b in boxes), boxes[0][1], max(b[2] for b in boxes), boxes[-1][3])]
+        self._enter('partial')
+        send_windows(self.epd, self.path, frame, boxes)
+        self.last_frame = data
+        self.partial_refreshes += 1
+        return 'partial'
+
+    def refresh_full(self, frame):
+        """Full refresh through the base method, whatever changed."""
+        self._enter('full')
+        getattr(self.epd, self.path.base)(frame)
+        self.last_frame = bytes(frame)
+        self.full_refreshes += 1
+        return 'full'
+
+    def sleep(self):
+        """Put the panel into deep sleep. The controller RAM is lost with it,
+        so the next frame gets a full refresh."""
+        self.epd.sleep()
+        self.mode = None
+        self.last_frame = None
+
+    def _enter(self, mode):
+        if self.mode == mode:
+            return
+        init = self.path.full_init if mode == 'full' else self.path.partial_init
+        if init is not None:
+            name, args = init
+            logger.debug("partial: %s%r for %s mode", name, args, mode)
+            if getattr(self.epd, name)(*args) == -1:
+                raise RuntimeError("panel init failed")
+        self.mode = mode
+
+### END OF FILE ###
@@ -0,0 +1,273 @@
+# *****************************************************************************
+# * | File        :	  epdscheduler.py
+# * | Function    :   Refresh-mode scheduler for the panel drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   pick the cheapest of full, fast, partial and 4-gray
+# * |                 refresh that keeps the panel free of ghosting
+# ******************************************************************************/
+
+import time
+import logging
+from collections import deque, namedtuple
+from . import epdbuffer
+from . import epdpartial
+from . import epdpanels
+from . import epdsession
+from .epdpanels import FULL, FAST, PARTIAL, GRAY4
+
+logger = logging.getLogger(__name__)
+
+# init is (method name, args), method the display method run after it and
+# finish the (method name, args) calls that method needs to refresh
+RefreshMode = namedtuple('RefreshMode', 'init method finish', defaults=((),))
+
+# Drivers whose plain init()/display() is not their full refresh, from
+# epdsession.DRIVER_CALLS. The ones with a partial path take theirs from
+# epdpartial.PARTIAL_PATHS.
+FULL_MODES = {name: RefreshMode(calls.init, calls.display, calls.finish)
+              for name, calls in epdsession.DRIVER_CALLS.items()}
+
+FAST_MODES = {
+    'epd2in13_V4': RefreshMode(('init_fast', ()), 'display_fast'),
+    'epd2in7_V2': RefreshMode(('init_Fast', ()), 'display_Fast'),
+    'epd2in9_V2': RefreshMode(('init_Fast', ()), 'display'),
+    'epd4in26': RefreshMode(('init_Fast', ()), 'display_Fast'),
+    'epd4in2_V2': RefreshMode(('init_fast', (0,)), 'display_Fast'),   # Seconds_1_5S
+    'epd5in79': RefreshMode(('init_Fast', ()), 'display_Fast'),
+    'epd7in5_V2': RefreshMode(('init_fast', ()), 'display'),
+    'epd7in5_V2_old': RefreshMode(('init_fast', ()), 'display'),
+}
+
+GRAY4_MODES = {
+    'epd13in3k': RefreshMode(('init_4GRAY', ()), 'display_4Gray'),
+    'epd2in7': RefreshMode(('Init_4Gray', ()), 'display_4Gray'),
+    'epd2in7_V2': RefreshMode(('Init_4Gray', ()), 'display_4Gray'),
+    'epd2in9_V2': RefreshMode(('Init_4Gray', ()), 'display_4Gray'),
+    'epd3in7': RefreshMode(('init', (0,)), 'display_4Gray'),
+    'epd4in2': RefreshMode(('Init_4Gray', ()), 'display_4Gray'),
+    'epd4in26': RefreshMode(('init_4GRAY', ()), 'display_4Gray'),
+    'epd4in2_V2': RefreshMode(('Init_4Gray', ()), 'display_4Gray'),
+    'epd5in79': RefreshMode(('init_4Gray', ()), 'display_4Gray'),
+    'epd7in5_V2': RefreshMode(('init_4Gray', ()), 'display_4Gray'),
+}
+
+# Limits before a full refresh has to clear the ghosting the cheaper
+# modes leave: partial refreshes in a row, their summed changed area as
+# a share of the panel, and fast refreshes in a row
+LIMITS = {'max_partials': 5, 'max_damage': 1.0, 'max_fast': 5}
+
+# Panels that ghost sooner or later than LIMITS allows for
+PANEL_LIMITS = {
+    # Partial waveforms of the older controllers, driven by a LUT the
+    # driver uploads, leave the most residue
+    'epd1in54_V2': {'max_partials': 3, 'max_damage': 0.5},
+    'epd2in13_V2': {'max_partials': 3, 'max_damage': 0.5},
+    # The OTP partial waveforms of the V3/V4 controllers stay clean for
+    # a clock face's worth of updates
+    'epd2in13_V3': {'max_partials': 10, 'max_damage': 2.0},
+    'epd2in13_V4': {'max_partials': 10, 'max_damage': 2.0},
+    # Windowed partials on the large panels, fast modes that skip the
+    # full drive sequence
+    'epd13in3k': {'max_damage': 0.5},
+    'epd7in5_V2': {'max_damage': 0.5, 'max_fast': 3},
+    'epd7in5_V2_old': {'max_damage': 0.5, 'max_fast': 3},
+    'epd4in2_V2': {'max_fast': 3},
+}
+
+Decision = namedtuple('Decision', 'mode reason expected actual')
+
+
+def panel_name(epd):
+    return type(epd).__module__.rsplit('.', 1)[-1]
+
+
+def refresh_modes(epd):
+    """The refresh modes a driver instance offers, mode name -> RefreshMode.
+
+    The partial entry is the driver's epdpartial.PartialPath instead.
+    """
+    return panel_modes(panel_name(epd))
+
+
+def panel_modes(name):
+    """refresh_modes by driver module name, such as 'epd2in13_V4'."""
+    path = epdpartial.PARTIAL_PATHS.get(name)
+    modes = {}
+    if path is not None:
+        modes[FULL] = RefreshMode(path.full_init, path.base)
+        modes[PARTIAL] = path
+    else:
+        modes[FULL] = FULL_MODES.get(name, RefreshMode(('init', ()), 'display'))
+    if name in FAST_MODES:
+        modes[FAST] = FAST_MODES[name]
+    if name in GRAY4_MODES:
+        modes[GRAY4] = GRAY4_MODES[name]
+    return modes
+
+
+def panel_limits(name):
+    """The ghosting limits of a driver module name such as 'epd2in13_V4':
+    LIMITS with its PANEL_LIMITS entry on top."""
+    limits = dict(LIMITS)
+    limits.update(PANEL_LIMITS.get(name, {}))
+    return limits
+
+
+def expected_refresh_s(epd, mode):
+    """Typical time in seconds a refresh in mode keeps the panel busy."""
+    return epdpanels.typical_refresh_ms(panel_name(epd), mode) / 1000.0
+
+
+def has_gray(image):
+    # Only grayscale images with tones between black and white need 4-gray;
+    # '1' and color images are dithered to black and white by getbuffer
+    if image.mode != 'L':
+        return False
+    return any(image.histogram()[1:255])
+
+
+class RefreshScheduler:
+    """Pick the cheapest refresh mode that is valid for each frame.
+
+    epd is a driver instance. Each frame is diffed against the one on
+    the panel: unchanged frames are skipped, small changes go through
+    the partial path while the panel stays within its limits
+    (panel_limits() of the driver, overridden per keyword), larger ones through the fast mode,
+    and everything else, or whatever the limits no longer allow, through
+    a full refresh that resets the counters. Grayscale images go to the
+    4-gray mode when the panel has one.
+
+    The controller keeps the mode it was last inited for; init only runs
+    when a frame needs a different one. Every refresh is logged and
+    kept in decisions as a Decision with the expected and the measured
+    time in seconds.
+    """
+
+    def __init__(self, epd, full_fraction=0.5, max_windows=4, history=32, **limits):
+        self.epd = epd
+        self.modes = refresh_modes(epd)
+        self.limits = panel_limits(panel_name(epd))
+        unknown = set(limits) - set(LIMITS)
+        if unknown:
+            raise TypeError("unknown limits: %s" % ", ".join(sorted(unknown)))
+        self.limits.update(limits)
+        self.full_fraction = full_fraction
+        self.max_windows = max_windows
+        self.row_bytes = (epd.width + 7) // 8
+        self.mode = None
+        self.last_frame = None
+        self.partials = 0
+        self.damage = 0.0
+        self.fasts = 0
+        self.based = False
+        self.decisions = deque(maxlen=history)
+
+    def show(self, image):
+        """Display a PIL image. Returns the Decision, None when nothing changed."""
+        if GRAY4 in self.modes and has_gray(image):
+            return self.show_frame(self.epd.getbuffer_4Gray(image))
+        return self.show_frame(epdsession.pack(self.epd, image))
+
+    def show_frame(self, frame):
+        """Display a buffer from getbuffer or getbuffer_4Gray, or a
+        dual-plane FrameBuffer on a tri-color panel. Returns the
+        Decision, None when it was already on the panel."""
+        data = bytes(frame)
+        frame_format = getattr(frame, 'format', epdbuffer.FORMAT_1BPP)
+        if frame_format == epdbuffer.FORMAT_2BPP and GRAY4 in self.modes:
+            if data == self.last_frame:
+                return None
+            return self._refresh(GRAY4, "grayscale frame", frame)
+        if self.last_frame is None or self.mode == GRAY4 or frame_format != epdbuffer.FORMAT_1BPP:
+            # Only 1bpp frames diff against a 1bpp frame on the panel
+            if data == self.last_frame:
+                return None
+            return self._refresh(FULL, "no 1bpp frame to diff against", frame)
+        boxes = epdbuffer.dirty_rects(self.last_frame, data, self.row_bytes, self.epd.height)
+        if not boxes:
+            logger.debug("scheduler: frame unchanged, refresh skipped")
+            return None
+        share = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes) / float(self.row_bytes * 8 * self.epd.height)
+        mode, reason = self._choose(share)
+        if mode == PARTIAL:
+            if len(boxes) > self.max_windows:
+                boxes = [(min(b[0] for b in boxes), boxes[0][1], max(b[2] for b in boxes), boxes[-1][3])]
+            return self._refresh(PARTIAL, reason, frame, boxes, share)
+        return self._refresh(mode, reason, frame)
+
+    def refresh_full(self, frame):
+        """Full refresh whatever changed, e.g. to clear ghosting by hand."""
+        return self._refresh(FULL, "requested", frame)
+
+    def sleep(self):
+        """Put the panel into deep sleep. The controller RAM is lost with it,
+        so the next frame gets a full refresh."""
+        getattr(self.epd, epdsession.driver_calls(self.epd).sleep)()
+        self.mode = None
+        self.last_frame = None
+
+    def _choose(self, share):
+        # Ghosting left by partial refreshes is only cleared by a full one
+        if share > self.full_fraction:
+            if self.partials:
+                return FULL, "%.0f%% of the panel changed after %d partial refreshes" % (share * 100, self.partials)
+            reason = "%.0f%% of the panel changed" % (share * 100)
+        elif PARTIAL not in self.modes:
+            reason = "no partial mode"
+        elif not self.based:
+            reason = "no partial base since the fast refresh"
+        elif self.partials >= self.limits['max_partials']:
+            return FULL, "%d partial refreshes since the last full one" % self.partials
+        elif self.damage + share > self.limits['max_damage']:
+            return FULL, "partial damage over %.0f%% of the panel" % (self.limits['max_damage'] * 100)
+        else:
+            return PARTIAL, "%.1f%% of the panel changed" % (share * 100)
+        if FAST in self.modes and self.fasts < self.limits['max_fast']:
+            return FAST, reason
+        return FULL, reason
+
+    def _enter(self, mode):
+        # Re-init only when the controller is set up for another mode
+        if self.mode == mode:
+            return
+        init = self.modes[mode].partial_init if mode == PARTIAL else self.modes[mode].init
+        if init is not None:
+            logger.debug("scheduler: %s%r for %s mode", init[0], init[1], mode)
+            if epdsession.invoke(self.epd, init) == -1:
+                raise RuntimeError("panel init failed")
+        self.mode = mode
+
+    def _refresh(self, mode, reason, frame, boxes=None, share=1.0):
+        clock = getattr(self.epd.config, 'clock', time.perf_counter)
+        start = clock()
+        self._enter(mode)
+        if mode == PARTIAL:
+            epdpartial.send_windows(self.epd, self.modes[PARTIAL], frame, boxes)
+            self.partials += 1
+            self.damage += share
+        else:
+            method = getattr(self.epd, self.modes[mode].method)
+            if getattr(frame, 'format', None) == epdbuffer.FORMAT_DUAL:
+                method(*frame.planes())
+            else:
+                method(frame)
+            for call in self.modes[mode].finish:
+                epdsession.invoke(self.epd, call)
+            if mode == FAST:
+                self.fasts += 1
+            else:
+                self.fasts = 0
+            self.partials = 0
+            self.damage = 0.0
+            # Only the full refresh writes the frame partials are diffed against
+            self.based = mode == FULL
+        self.last_frame = bytes(frame)
+        decision = Decision(mode, reason, expected_refresh_s(self.epd, mode), clock() - start)
+        logger.debug("scheduler: %s refresh (%s), expected %.2f s, took %.2f s",
+                     decision.mode, decision.reason, decision.expected, decision.actual)
+        self.decisions.append(decision)
+        return decision
+
+### END OF FILE ###
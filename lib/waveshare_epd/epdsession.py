@@ -0,0 +1,190 @@
+# *****************************************************************************
+# * | File        :	  epdsession.py
+# * | Function    :   Long-lived display session around one panel driver
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   track the controller state so init, Clear and
+# * |                 refreshes only happen when they change something
+# ******************************************************************************/
+
+import logging
+import threading
+from collections import namedtuple
+from . import epdbuffer
+
+logger = logging.getLogger(__name__)
+
+# init and clear are (method name, args), display and sleep the names of
+# the methods that show a frame and enter deep sleep, and finish the
+# (method name, args) calls a display needs after it to reach the glass.
+# String args name an attribute of the driver, e.g. its LUT
+DriverCalls = namedtuple('DriverCalls', 'init display clear sleep finish', defaults=((),))
+
+DEFAULT_CALLS = DriverCalls(('init', ()), 'display', ('Clear', ()), 'sleep')
+
+# Drivers whose full-refresh calls differ from the default
+DRIVER_CALLS = {
+    'epd1in02': DriverCalls(('Init', ()), 'display', ('Clear', ()), 'Sleep'),
+    'epd1in54': DriverCalls(('init', ('lut_full_update',)), 'display', ('Clear', ()), 'sleep'),
+    'epd1in54_V2': DriverCalls(('init', (0,)), 'display', ('Clear', ()), 'sleep'),          # isPartial
+    'epd2in13': DriverCalls(('init', ('lut_full_update',)), 'display', ('Clear', ()), 'sleep'),
+    'epd2in13_V2': DriverCalls(('init', (0,)), 'display', ('Clear', ()), 'sleep'),          # FULL_UPDATE
+    'epd2in66': DriverCalls(('init', (0,)), 'display', ('Clear', ()), 'sleep'),             # full
+    'epd2in9': DriverCalls(('init', ('lut_full_update',)), 'display', ('Clear', ()), 'sleep'),
+    'epd3in52': DriverCalls(('init', ()), 'display', ('Clear', ()), 'sleep',                # display only writes RAM
+                            (('lut_GC', ()), ('refresh', ()))),
+    'epd3in7': DriverCalls(('init', (1,)), 'display_1Gray', ('Clear', (0xFF, 1)), 'sleep'), # 1Gray
+}
+
+
+def driver_calls(epd):
+    """The DriverCalls of a driver instance."""
+    return DRIVER_CALLS.get(type(epd).__module__.rsplit('.', 1)[-1], DEFAULT_CALLS)
+
+
+def pack(epd, image):
+    """The frame a driver displays for a PIL image: getbuffer, or on
+    tri-color panels a dual-plane FrameBuffer from getbuffer_color."""
+    if hasattr(epd, 'getbuffer_color'):
+        # Tri-color panels take the black and the accent plane together
+        black, accent = epd.getbuffer_color(image)
+        return epdbuffer.FrameBuffer.dual(black, accent, epd.width, epd.height)
+    return epd.getbuffer(image)
+
+
+def invoke(epd, call):
+    """Run call, a (method name, args) pair, on the driver epd."""
+    name, args = call
+    return getattr(epd, name)(*[getattr(epd, arg) if isinstance(arg, str) else arg for arg in args])
+
+
+class DisplaySession:
+    """Keep one panel driver alive across many frames.
+
+    epd is a driver instance such as epd2in66g.EPD(); drivers whose init,
+    display, Clear or sleep need arguments or other names, or whose
+    display needs more calls to refresh, are run through their
+    DRIVER_CALLS entry. The session inits the controller on first use and again only
+    after sleep, skips frames identical to the one already on the panel,
+    and puts the panel into deep sleep once it has been idle for
+    idle_timeout seconds (None keeps it powered until sleep() or close()).
+    """
+
+    def __init__(self, epd, idle_timeout=60.0):
+        self.epd = epd
+        self.calls = driver_calls(epd)
+        self.idle_timeout = idle_timeout
+        self.powered = False
+        self.initialized = False
+        self.asleep = False
+        self.last_frame = None
+        self._lock = threading.RLock()
+        self._timer = None
+
+    @property
+    def width(self):
+        return self.epd.width
+
+    @property
+    def height(self):
+        return self.epd.height
+
+    def wake(self):
+        # Power up and init the controller unless it is ready already
+        with self._lock:
+            self._cancel_timer()
+            if not self.initialized:
+                logger.debug("session: init")
+                if invoke(self.epd, self.calls.init) == -1:
+                    raise RuntimeError("panel init failed")
+                self.powered = True
+                self.initialized = True
+                self.asleep = False
+
+    def pack(self, image):
+        """The frame show_frame takes for a PIL image. Touches no hardware."""
+        return pack(self.epd, image)
+
+    def show(self, image):
+        """Display a PIL image. Returns False when it was already on the panel."""
+        with self._lock:
+            return self.show_frame(self.pack(image))
+
+    def show_frame(self, frame):
+        """Display a buffer from getbuffer, or a dual-plane FrameBuffer on a
+        tri-color panel. Returns False when it was already on the panel."""
+        with self._lock:
+            data = bytes(frame)
+            if data == self.last_frame:
+                logger.debug("session: frame unchanged, refresh skipped")
+                self._arm_timer()
+                return False
+            self.wake()
+            display = getattr(self.epd, self.calls.display)
+            if getattr(frame, 'format', None) == epdbuffer.FORMAT_DUAL:
+                display(*frame.planes())
+            else:
+                display(frame)
+            for call in self.calls.finish:
+                invoke(self.epd, call)
+            self.last_frame = data
+            self._arm_timer()
+            return True
+
+    def clear(self):
+        """Clear the panel unless nothing has been drawn since the last clear."""
+        with self._lock:
+            if self.last_frame == b'':
+                self._arm_timer()
+                return False
+            self.wake()
+            invoke(self.epd, self.calls.clear)
+            # The cleared state has no buffer of its own, mark it apart
+            # from every real frame
+            self.last_frame = b''
+            self._arm_timer()
+            return True
+
+    def sleep(self):
+        """Put the panel into deep sleep; the next frame inits it again."""
+        with self._lock:
+            self._cancel_timer()
+            if self.initialized:
+                logger.debug("session: deep sleep")
+                getattr(self.epd, self.calls.sleep)()
+            # Deep sleep keeps the image but loses the controller setup
+            self.initialized = False
+            self.powered = False
+            self.asleep = True
+
+    def close(self):
+        with self._lock:
+            self.sleep()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _arm_timer(self):
+        self._cancel_timer()
+        if self.idle_timeout is not None and self.initialized:
+            self._timer = threading.Timer(self.idle_timeout, self._idle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _idle(self):
+        with self._lock:
+            # A frame may have re-armed the timer while this one waited
+            if self._timer is not None and self._timer is threading.current_thread():
+                self._timer = None
+                self.sleep()
+
+### END OF FILE ###
@@ -0,0 +1,132 @@
+# *****************************************************************************
+# * | File        :	  epdworker.py
+# * | Function    :   Background display worker for one panel
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :   latest frame wins: while the panel refreshes only the
+# * |                 newest pending frame is kept, older ones are dropped
+# ******************************************************************************/
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DisplayWorker:
+    """Refresh one panel from a thread of its own, newest frame first.
+
+    target is what draws the frames: an epdsession.DisplaySession, or an
+    epdscheduler.RefreshScheduler on panels with partial refresh. Any
+    thread may submit images or frames; submit never waits for the panel.
+    While a refresh is in flight only the newest pending frame is kept
+    and the ones it replaces are counted in dropped. Images are packed on
+    the worker only when their turn comes, so dropped ones cost nothing.
+    A scheduler diffs the frame it gets against the one on the panel, so
+    the changes of the dropped frames end up in that one refresh.
+
+    submitted, shown, skipped (unchanged frames), dropped and errors
+    count frames; depth is the number of frames pending or in flight.
+    """
+
+    def __init__(self, target, name='epd-worker'):
+        self.target = target
+        self.submitted = 0
+        self.shown = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self._cond = threading.Condition()
+        self._pending = None
+        self._in_flight = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def width(self):
+        return self.target.epd.width
+
+    @property
+    def height(self):
+        return self.target.epd.height
+
+    @property
+    def depth(self):
+        with self._cond:
+            return (self._pending is not None) + self._in_flight
+
+    def submit(self, image):
+        """Queue a PIL image, replacing any frame still pending."""
+        self._put(self.target.show, image)
+
+    def submit_frame(self, frame):
+        """Queue a packed frame, see the target's show_frame."""
+        self._put(self.target.show_frame, frame)
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted frame is on the panel or dropped.
+        Returns False when timeout seconds pass first."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._in_flight, timeout)
+
+    def close(self, timeout=None):
+        """Finish the pending frame, stop the worker and put the panel to sleep.
+
+        When timeout seconds pass with a refresh still in flight the panel
+        is left awake, as sleep would cut into its upload. Returns whether
+        the worker stopped.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("worker: still refreshing after %s s, panel not put to sleep", timeout)
+            return False
+        self.target.sleep()
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _put(self, show, item):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("display worker is closed")
+            self.submitted += 1
+            if self._pending is not None:
+                self.dropped += 1
+                logger.debug("worker: pending frame dropped for a newer one")
+            self._pending = (show, item)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    return
+                show, item = self._pending
+                self._pending = None
+                self._in_flight = True
+            try:
+                if show(item):
+                    self.shown += 1
+                else:
+                    self.skipped += 1
+            except Exception as e:
+                logger.exception("worker: refresh failed")
+                self.errors += 1
+                self.last_error = e
+            finally:
+                with self._cond:
+                    self._in_flight = False
+                    self._cond.notify_all()
+
+### END OF FILE ###
@@ -13,6 +13,8 @@ if os.path.exists(libdir):
     sys.path.append(libdir)
 
 from waveshare_epd import epd2in66g
+from waveshare_epd.epdsession import DisplaySession
+from waveshare_epd.epdworker import DisplayWorker
 
 
 
@@ -35,6 +37,14 @@ GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 photos_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pic')
 
+# Seconds without a new photo before the panel goes into deep sleep
+IDLE_SLEEP_S = 120
+
+# One display session for the whole run: init once, sleep when idle. The
+# worker refreshes it in the background and only ever shows the newest
+# photo, so button presses during a refresh don't queue up
+worker = DisplayWorker(DisplaySession(epd2in66g.EPD(), idle_timeout=IDLE_SLEEP_S))
+
 
 
 
@@ -61,11 +71,6 @@ def capture_image(camera):
 def display_image(image_path):
     """Displays an image on the e-paper display, filling the screen width."""
     try:
-        logging.info("Initializing the e-paper display")
-        epd = epd2in66g.EPD()
-        epd.init()
-        epd.Clear()
-
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image not found: {image_path}")
 
@@ -73,8 +78,8 @@ def display_image(image_path):
         image = Image.open(image_path)
         
         # Calculate the aspect ratio and new dimensions
-        display_width = epd.height  # Since we rotate later, we use height
-        display_height = epd.width
+        display_width = worker.height  # Since we rotate later, we use height
+        display_height = worker.width
         
         # Calculate scaling factors for both dimensions
         width_ratio = display_width / image.width
@@ -100,9 +105,8 @@ def display_image(image_path):
         # Rotate for landscape mode (270 degrees instead of 90)
         image = image.rotate(270, expand=True)
 
-        logging.info("Displaying the image on the e-paper")
-        epd.display(epd.getbuffer(image))
-        time.sleep(3)
+        logging.info("Queueing the image for the e-paper")
+        worker.submit(image)
     except Exception as e:
         logging.error(f"Error displaying image: {e}")
         sys.exit(1)
@@ -151,5 +155,6 @@ if __name__ == "__main__":
         logging.info("Process interrupted by user")
         if picam2 is not None:
             picam2.close()
+        worker.close()
         epd2in66g.epdconfig.module_exit(cleanup=True)
         sys.exit(0)
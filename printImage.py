@@ -4,9 +4,9 @@ import sys
 import os
 import logging
 from waveshare_epd import epd2in66g
+from waveshare_epd.epdsession import DisplaySession
 from PIL import Image
 import traceback
-import time
 
 # Setup paths
 picdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pic')
@@ -17,29 +17,36 @@ if os.path.exists(libdir):
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+# Reused by every display_image call, so the panel is only re-initialized
+# after it went to sleep. Created on first use, so importing this module
+# does not claim the panel
+_session = None
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = DisplaySession(epd2in66g.EPD())
+    return _session
+
 def display_image(image_path):
     """Displays an image on the e-paper display."""
     try:
-        logging.info("Initializing the e-paper display")
-        epd = epd2in66g.EPD()
-        epd.init()
-        epd.Clear()
-
         # Load the image
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image not found: {image_path}")
 
+        session = get_session()
         logging.info(f"Loading image: {image_path}")
         image = Image.open(image_path)
 
         # Ensure image dimensions match display (horizontal orientation)
-        image = image.resize((epd.height, epd.width))  # Resize to fit display
+        image = image.resize((session.height, session.width))  # Resize to fit display
         image = image.rotate(270, expand=True)  # Rotate for landscape mode
 
         # Display the image
         logging.info("Displaying the image on the e-paper")
-        epd.display(epd.getbuffer(image))
-        time.sleep(3)
+        if not session.show(image):
+            logging.info("Image unchanged, refresh skipped")
 
     except IOError as e:
         logging.error(f"I/O Error: {e}")
@@ -47,6 +54,7 @@ def display_image(image_path):
         logging.error(f"File Error: {e}")
     except KeyboardInterrupt:
         logging.info("Process interrupted by user")
+        get_session().close()
         epd2in66g.epdconfig.module_exit(cleanup=True)
         exit()
     except Exception as e:
@@ -57,3 +65,4 @@ if __name__ == '__main__':
     # Example usage
     example_image = "example.jpg"  # Replace with the path to your processed image
     display_image(example_image)
+    get_session().close()
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""AsyncPanel against the virtual backend: show, timeouts and cancellation.
+
+Run from the repository root:  python3 -m pytest tests
+"""
+import sys
+import os
+import time
+import asyncio
+import unittest
+
+os.environ['EPD_BACKEND'] = 'virtual'
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig, epdasync, epd2in13_V4
+
+
+def frame_image(epd, size):
+    image = Image.new('1', (epd.width, epd.height), 255)
+    ImageDraw.Draw(image).rectangle((0, 0, size, size), fill=0)
+    return image
+
+
+class AsyncPanelTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        # Real waits, but short ones unless a test needs a long refresh
+        self.backend = epdconfig.create()
+        self.backend.time_scale = 1.0
+        self.backend.refresh_ms = 200
+        self.panel = epdasync.AsyncPanel(epd2in13_V4.EPD(self.backend), idle_timeout=None)
+
+    async def asyncTearDown(self):
+        # Nothing left to test in the sleep sequence, skip its waits
+        self.backend.time_scale = 0
+        await self.panel.close()
+
+    async def test_show(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        try:
+            image = frame_image(self.panel.epd, 20)
+            self.assertTrue(await self.panel.show(image))
+        finally:
+            task.cancel()
+        self.assertEqual(self.backend.refreshes, 1)
+        self.assertIn(bytes(self.panel.epd.getbuffer(image)), self.backend.read_ram().values())
+        # The event loop kept running through the refresh
+        self.assertGreater(ticks, 5)
+        # The same frame again is skipped
+        self.assertFalse(await self.panel.show(image))
+        self.assertEqual(self.backend.refreshes, 1)
+
+    async def test_timeout(self):
+        self.backend.refresh_ms = 5000
+        start = time.perf_counter()
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.panel.show(frame_image(self.panel.epd, 20), timeout=0.3)
+        # The driver let go at its next busy wait, long before the refresh ended
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertFalse(self.panel.session.initialized)
+        self.assertIsNone(self.panel.session.last_frame)
+        # The next call inits the controller again and goes through
+        self.backend.refresh_ms = 50
+        self.assertTrue(await self.panel.show(frame_image(self.panel.epd, 30)))
+        self.assertTrue(self.panel.session.initialized)
+
+    async def test_cancel(self):
+        self.backend.refresh_ms = 5000
+        task = asyncio.create_task(self.panel.clear())
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertFalse(self.panel.session.initialized)
+        # The panel is free again for the next call
+        self.backend.refresh_ms = 50
+        self.assertTrue(await self.panel.show(frame_image(self.panel.epd, 20)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""The panel descriptor table against the drivers, epdscheduler and the
+virtual backend.
+
+Run from the repository root:  python3 -m pytest tests
+"""
+import sys
+import os
+import glob
+import importlib
+import subprocess
+import unittest
+
+os.environ['EPD_BACKEND'] = 'virtual'
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from waveshare_epd import epdconfig, epdpanels, epdscheduler
+
+
+class PanelTableTest(unittest.TestCase):
+
+    def test_every_driver_has_a_panel(self):
+        paths = glob.glob(os.path.join(libdir, 'waveshare_epd', 'epd[0-9]*.py'))
+        names = sorted(os.path.basename(path)[3:-3] for path in paths)
+        self.assertEqual(names, sorted(epdpanels.PANELS))
+
+    def test_metadata_matches_the_drivers(self):
+        for panel in epdpanels.panels():
+            with self.subTest(panel=panel.name):
+                module = panel.driver()
+                self.assertEqual((panel.width, panel.height), (module.EPD_WIDTH, module.EPD_HEIGHT))
+                self.assertEqual(panel.spi_hz, getattr(module, 'EPD_SPI_HZ', epdconfig.DEFAULT_SPI_HZ))
+                name = 'epd' + panel.name
+                self.assertEqual(set(panel.modes), set(epdscheduler.panel_modes(name)))
+                self.assertEqual(panel.refresh_ms[epdpanels.FULL], epdconfig.Virtual.typical_refresh_ms(name))
+
+    def test_lookup_imports_no_driver(self):
+        # A fresh interpreter, this one has imported every driver already
+        code = ("import sys; import waveshare_epd as w; p = w.get_panel('4in2_V2'); "
+                "p.modes, p.spi_hz, p.refresh_ms; "
+                "print(sorted(m for m in sys.modules if m.startswith('waveshare_epd.epd')), 'numpy' in sys.modules)")
+        env = dict(os.environ, PYTHONPATH=libdir)
+        output = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        self.assertEqual(output.split(), ["['waveshare_epd.epdpanels']", 'False'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""RefreshScheduler over every driver on the virtual backend, and its
+per-panel ghosting limits.
+
+Run from the repository root:  python3 -m pytest tests
+"""
+import sys
+import os
+import glob
+import importlib
+import unittest
+
+os.environ['EPD_BACKEND'] = 'virtual'
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig, epdscheduler, epd2in13_V4
+from waveshare_epd.epdscheduler import RefreshScheduler, FULL, PARTIAL
+
+
+def driver_names():
+    paths = glob.glob(os.path.join(libdir, 'waveshare_epd', 'epd[0-9]*.py'))
+    return sorted(os.path.basename(path)[:-3] for path in paths)
+
+
+def open_driver(module):
+    backend = epdconfig.create()
+    # Simulated waits only
+    backend.time_scale = 0
+    return module.EPD(backend), backend
+
+
+class RefreshSchedulerTest(unittest.TestCase):
+
+    def test_every_driver_refreshes(self):
+        for name in driver_names():
+            with self.subTest(driver=name):
+                epd, backend = open_driver(importlib.import_module('waveshare_epd.' + name))
+                scheduler = RefreshScheduler(epd)
+                image = Image.new('RGB', (epd.width, epd.height), (255, 255, 255))
+                draw = ImageDraw.Draw(image)
+                draw.rectangle((2, 2, 20, 20), fill=(0, 0, 0))
+                self.assertEqual(scheduler.show(image).mode, FULL)
+                shown = backend.refreshes
+                self.assertGreaterEqual(shown, 1)
+                draw.rectangle((30, 30, 40, 40), fill=(0, 0, 0))
+                self.assertIsNotNone(scheduler.show(image))
+                self.assertGreater(backend.refreshes, shown)
+                scheduler.sleep()
+
+    def test_panel_limits(self):
+        epd, _ = open_driver(epd2in13_V4)
+        self.assertEqual(RefreshScheduler(epd).limits, epdscheduler.panel_limits('epd2in13_V4'))
+        self.assertEqual(RefreshScheduler(epd, max_partials=2).limits['max_partials'], 2)
+        # Panels without an entry keep the defaults
+        self.assertEqual(epdscheduler.panel_limits('epd2in66g'), epdscheduler.LIMITS)
+        with self.assertRaises(TypeError):
+            RefreshScheduler(epd, max_ghosts=1)
+
+    def test_partials_until_the_panel_limit(self):
+        epd, _ = open_driver(epd2in13_V4)
+        scheduler = RefreshScheduler(epd)
+        limit = scheduler.limits['max_partials']
+        image = Image.new('1', (epd.width, epd.height), 255)
+        draw = ImageDraw.Draw(image)
+        modes = []
+        for i in range(limit + 2):
+            draw.rectangle((0, i * 4, 8, i * 4 + 2), fill=0)
+            modes.append(scheduler.show(image).mode)
+        self.assertEqual(modes, [FULL] + [PARTIAL] * limit + [FULL])
+
+
+if __name__ == '__main__':
+    unittest.main()
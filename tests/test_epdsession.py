@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""DisplaySession over every driver on the virtual backend.
+
+Run from the repository root:  python3 -m pytest tests
+"""
+import sys
+import os
+import glob
+import importlib
+import unittest
+
+os.environ['EPD_BACKEND'] = 'virtual'
+
+libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig
+from waveshare_epd.epdsession import DisplaySession
+
+
+def driver_names():
+    paths = glob.glob(os.path.join(libdir, 'waveshare_epd', 'epd[0-9]*.py'))
+    return sorted(os.path.basename(path)[:-3] for path in paths)
+
+
+def frame_image(width, height):
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    ImageDraw.Draw(image).rectangle((2, 2, 20, 20), fill=(0, 0, 0))
+    return image
+
+
+class DisplaySessionTest(unittest.TestCase):
+
+    def test_every_driver_refreshes(self):
+        for name in driver_names():
+            with self.subTest(driver=name):
+                module = importlib.import_module('waveshare_epd.' + name)
+                backend = epdconfig.create()
+                # Simulated waits only
+                backend.time_scale = 0
+                session = DisplaySession(module.EPD(backend), idle_timeout=None)
+                # show() only reports a frame that reached the glass
+                self.assertTrue(session.show(frame_image(session.width, session.height)))
+                shown = backend.refreshes
+                self.assertGreaterEqual(shown, 1)
+                self.assertTrue(session.clear())
+                self.assertGreater(backend.refreshes, shown)
+                session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()